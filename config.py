@@ -8,22 +8,40 @@ DEFAULT_CONFIG = {
     "TELEGRAM_CHAT_ID": os.environ.get("TELEGRAM_CHAT_ID"),
     "SENSITIVITY": int(os.environ.get("SENSITIVITY", "25")),
     "MIN_AREA": int(os.environ.get("MIN_AREA", "500")),
+    "MIN_ANALYZE_AREA": int(os.environ.get("MIN_ANALYZE_AREA", "1500")),
+    "MOTION_WORK_WIDTH": int(os.environ.get("MOTION_WORK_WIDTH", "320")),
+    "MOTION_USE_GPU": os.environ.get("MOTION_USE_GPU", "False").lower() == "true",
+    "MOTION_BACKGROUND": os.environ.get("MOTION_BACKGROUND", "mog2"),
+    "MOTION_BUSY_STRIDE": int(os.environ.get("MOTION_BUSY_STRIDE", "2")),
+    "MOTION_HI_THRESH": int(os.environ.get("MOTION_HI_THRESH", "0")),
+    "MOTION_LO_THRESH": int(os.environ.get("MOTION_LO_THRESH", "0")),
     "FRAME_DIR": os.environ.get("FRAME_DIR", "frames"),
     "WEB_HOST": os.environ.get("WEB_HOST", "0.0.0.0"),
     "WEB_PORT": int(os.environ.get("WEB_PORT", "5000")),
+    "WEB_ASYNC_MODE": os.environ.get("WEB_ASYNC_MODE", "threading"),
+    "JPEG_QUALITY": int(os.environ.get("JPEG_QUALITY", "80")),
+    "JPEG_ENCODER": os.environ.get("JPEG_ENCODER", "cpu"),
     "DEBUG": os.environ.get("DEBUG", "False").lower() == "true",
+    "DEBUG_SAVE_FRAMES": os.environ.get("DEBUG_SAVE_FRAMES", "False").lower() == "true",
     "CAMERA_INDEX": int(os.environ.get("CAMERA_INDEX", "0")),
+    "CAPTURE_FPS": int(os.environ.get("CAPTURE_FPS", "10")),
+    "CAPTURE_BUFFER_SIZE": int(os.environ.get("CAPTURE_BUFFER_SIZE", "1")),
+    "EVENT_COOLDOWN": float(os.environ.get("EVENT_COOLDOWN", "1.0")),
     "EXPECTED_LABEL": os.environ.get("EXPECTED_LABEL", "cat"),
     "ANALYZER_MODEL_PATH": os.environ.get(
-        "ANALYZER_MODEL_PATH", "yolo_files/yolov3.weights"
+        "ANALYZER_MODEL_PATH", "yolo_files/yolov4-tiny.weights"
     ),
     "ANALYZER_CONFIG_PATH": os.environ.get(
-        "ANALYZER_CONFIG_PATH", "yolo_files/yolov3.cfg"
+        "ANALYZER_CONFIG_PATH", "yolo_files/yolov4-tiny.cfg"
     ),
     "ANALYZER_CLASSES_PATH": os.environ.get(
         "ANALYZER_CLASSES_PATH", "yolo_files/coco.names"
     ),
+    "ANALYZER_INPUT_SIZE": int(os.environ.get("ANALYZER_INPUT_SIZE", "416")),
+    "ANALYZER_BATCH_SIZE": int(os.environ.get("ANALYZER_BATCH_SIZE", "1")),
     "TARGET_OBJECTS": os.environ.get("TARGET_OBJECTS", "person"),
+    "ANALYZER_BACKEND": os.environ.get("ANALYZER_BACKEND", "auto"),
+    "ANALYZER_PRECISION": os.environ.get("ANALYZER_PRECISION", "auto"),
 }
 
 # Path to persistent config file (stores user overrides only)
@@ -1,7 +1,9 @@
 import cv2
+import collections
 import threading
 import time
 import logging
+from utils import encode_jpeg, HAVE_NVJPEG
 
 
 class FrameProducer:
@@ -10,18 +12,46 @@ class FrameProducer:
     Provides thread-safe access to the latest frame for multiple consumers.
     """
 
-    def __init__(self, camera_index=0, retry_delay=5):
+    def __init__(
+        self,
+        camera_index=0,
+        retry_delay=5,
+        target_fps=None,
+        buffer_size=None,
+        jpeg_encoder="cpu",
+    ):
         """
         Initialize the frame producer.
 
         Args:
             camera_index: Camera device index (default: 0)
             retry_delay: Seconds to wait before retrying after camera failure
+            target_fps: Maximum number of frames decoded per second. Frames in
+                between are grabbed but not decoded (default: None, no limit)
+            buffer_size: Number of frames the capture backend may queue; 1 keeps
+                frames fresh (default: None, backend default)
+            jpeg_encoder: "gpu" encodes large stream frames with nvJPEG when
+                available, "cpu" always uses the CPU (default: "cpu")
         """
         self.camera_index = camera_index
         self.retry_delay = retry_delay
-        self._frame = None
-        self._lock = threading.Lock()
+        self.target_fps = target_fps
+        self.buffer_size = buffer_size
+        # Latest (frame_id, frame) pair. deque.append and [-1] are atomic
+        # under the GIL, so publishing and reading need no lock, and the id
+        # always describes the frame it was published with.
+        self._frames = collections.deque(maxlen=1)
+        self._frame_id = 0
+        # Set by request_latest() to make the capture loop decode right away;
+        # waiters (request_latest, wait_for_frame) are woken through
+        # _frame_cond every time a new frame is published
+        self._decode_requested = threading.Event()
+        self._frame_cond = threading.Condition()
+        # (frame_id, {quality: bytes}) for the latest frame, shared by all
+        # stream clients so each frame is encoded once per quality however
+        # many watch
+        self._jpeg = (None, {})
+        self._jpeg_lock = threading.Lock()
         self._running = False
         self._thread = None
         self._cap = None
@@ -29,6 +59,10 @@ class FrameProducer:
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
 
+        self.gpu_jpeg = jpeg_encoder == "gpu"
+        if self.gpu_jpeg and not HAVE_NVJPEG:
+            self.logger.warning("PyNvJpeg not available; encoding JPEG on the CPU")
+
     def start(self):
         """Start the frame capture thread."""
         if self._running:
@@ -43,20 +77,125 @@ class FrameProducer:
     def stop(self):
         """Stop the frame capture thread and release the camera."""
         self._running = False
+        with self._frame_cond:
+            self._frame_cond.notify_all()
         if self._thread is not None:
             self._thread.join(timeout=5)
         self._release_camera()
         self.logger.info("FrameProducer stopped")
 
-    def get_frame(self):
+    def get_frame(self, copy=True):
         """
-        Get the latest captured frame in a thread-safe manner.
+        Get the latest captured frame without taking a lock.
+
+        Args:
+            copy: Return a private copy (default). With copy=False the shared
+                frame is returned without a memcpy; every frame is decoded into
+                a new buffer, so the producer never writes into a published
+                frame, but callers must treat it as read-only.
 
         Returns:
             numpy.ndarray: The latest frame, or None if no frame is available
         """
-        with self._lock:
-            return self._frame.copy() if self._frame is not None else None
+        frame = self._latest()[1]
+        if frame is None:
+            return None
+        return frame.copy() if copy else frame
+
+    def request_latest(self, timeout=1.0, copy=True):
+        """
+        Ask for a freshly decoded frame and wait for it.
+
+        With target_fps set the capture loop only grab()s between decodes; a
+        request makes it decode the most recently grabbed frame immediately,
+        so consumers get frames at their own cadence and never see the same
+        frame twice.
+
+        Args:
+            timeout: Maximum seconds to wait for a new frame
+            copy: See get_frame()
+
+        Returns:
+            numpy.ndarray: The new frame, or the latest one (possibly None) on timeout
+        """
+        start_id = self._frame_id
+        return self.wait_for_frame(start_id, timeout, copy, request=True)[1]
+
+    def wait_for_frame(self, last_id=0, timeout=1.0, copy=True, request=False):
+        """
+        Block until a frame newer than last_id is published.
+
+        Unless request is set this does not force a decode, so any number of
+        consumers can follow the capture rate; a slow consumer simply skips
+        the frames published while it was busy.
+
+        Args:
+            last_id: Frame id the caller already has (see get_frame_id()); the
+                default 0 waits for the first frame
+            timeout: Maximum seconds to wait for a new frame
+            copy: See get_frame()
+            request: If no newer frame is there yet, make the capture loop
+                decode one right away, like request_latest()
+
+        Returns:
+            tuple: (frame_id, frame), read together so the id always matches
+            the frame; frame_id is unchanged on timeout
+        """
+        with self._frame_cond:
+            if request and self._frame_id == last_id:
+                self._decode_requested.set()
+            self._frame_cond.wait_for(
+                lambda: self._frame_id != last_id or not self._running, timeout
+            )
+        frame_id, frame = self._latest()
+        if frame is not None and copy:
+            frame = frame.copy()
+        return frame_id, frame
+
+    def wait_for_jpeg(self, last_id=0, timeout=1.0, quality=80):
+        """
+        Like wait_for_frame(), but return the frame JPEG-encoded.
+
+        The first caller for a frame (at a given quality) encodes it;
+        concurrent and later callers get the same bytes. Nothing is encoded
+        while nobody asks.
+
+        Args:
+            last_id: See wait_for_frame()
+            timeout: Maximum seconds to wait for a new frame
+            quality: JPEG quality (1-100)
+
+        Returns:
+            tuple: (frame_id, jpeg_bytes); jpeg_bytes is None if no frame is
+            available or encoding failed
+        """
+        frame_id, frame = self.wait_for_frame(last_id, timeout, copy=False)
+        if frame is None:
+            return frame_id, None
+        with self._jpeg_lock:
+            cached_id, encoded = self._jpeg
+            if cached_id != frame_id:
+                encoded = {}
+                self._jpeg = (frame_id, encoded)
+            if quality not in encoded:
+                try:
+                    encoded[quality] = encode_jpeg(frame, quality, self.gpu_jpeg)
+                except Exception as e:
+                    self.logger.error(f"Error encoding frame: {e}")
+                    encoded[quality] = None
+            data = encoded[quality]
+        return frame_id, data
+
+    def _latest(self):
+        """Return the latest (frame_id, frame) pair; frame is None before the first."""
+        try:
+            return self._frames[-1]
+        except IndexError:
+            return self._frame_id, None
+
+    def get_frame_id(self):
+        """Return a counter that increases every time a new frame is captured."""
+        return self._frame_id
 
     def is_running(self):
         """Check if the frame producer is running."""
@@ -73,16 +212,38 @@ class FrameProducer:
                 time.sleep(self.retry_delay)
                 continue
 
+            interval = 1.0 / self.target_fps if self.target_fps else 0.0
+            next_time = time.monotonic()
+
             # Capture frames while camera is open and running
             while self._running and self._cap is not None and self._cap.isOpened():
-                ret, frame = self._cap.read()
+                if interval:
+                    # Keep grabbing (cheap, no decode) so the retrieved frame is current
+                    ret = self._cap.grab()
+                    while (
+                        ret
+                        and self._running
+                        and time.monotonic() < next_time
+                        and not self._decode_requested.is_set()
+                    ):
+                        ret = self._cap.grab()
+                    next_time = max(next_time + interval, time.monotonic())
+                    if ret:
+                        ret, frame = self._cap.retrieve()
+                else:
+                    ret, frame = self._cap.read()
                 if not ret:
                     self.logger.warning("Failed to read frame from camera")
                     break
 
-                # Update the shared frame in a thread-safe manner
-                with self._lock:
-                    self._frame = frame
+                # Publish the new frame; this evicts the previous one. Frames
+                # lent with copy=False stay valid for as long as they are held.
+                self._frames.append((self._frame_id + 1, frame))
+                self._frame_id += 1
+
+                self._decode_requested.clear()
+                with self._frame_cond:
+                    self._frame_cond.notify_all()
 
             # Camera failed or stopped, release and retry
             self._release_camera()
@@ -101,6 +262,12 @@ class FrameProducer:
             self._cap = cv2.VideoCapture(self.camera_index)
             if not self._cap.isOpened():
                 return False
+            if self.buffer_size is not None:
+                if not self._cap.set(cv2.CAP_PROP_BUFFERSIZE, self.buffer_size):
+                    self.logger.warning(
+                        f"Camera {self.camera_index} does not support "
+                        f"CAP_PROP_BUFFERSIZE={self.buffer_size}"
+                    )
             self.logger.info(f"Camera {self.camera_index} opened successfully")
             return True
         except Exception as e:
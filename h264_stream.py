@@ -0,0 +1,277 @@
+"""Fragmented-MP4 (H.264) live stream shared by all viewers.
+
+MJPEG sends every frame as a full JPEG, which is expensive over a WAN. This
+module pipes the producer's frames through one ffmpeg/libx264 process and
+splits its fragmented-MP4 output into the init segment (ftyp + moov) and
+moof + mdat fragments. Every subscriber gets the init segment followed by
+the fragments published while it is connected; with frag_keyframe each
+fragment starts on a keyframe, so a late joiner (or a client whose queue
+overflowed and lost a fragment) can start decoding at any fragment.
+
+ffmpeg is found through imageio-ffmpeg when installed, else on the PATH.
+"""
+
+import logging
+import queue
+import shutil
+import struct
+import subprocess
+import threading
+
+logger = logging.getLogger(__name__)
+
+try:
+    import imageio_ffmpeg
+
+    FFMPEG = imageio_ffmpeg.get_ffmpeg_exe()
+except Exception:
+    FFMPEG = shutil.which("ffmpeg")
+
+
+def ffmpeg_command(width, height, fps):
+    """Build the ffmpeg argv that encodes raw BGR frames on stdin to fMP4."""
+    return [
+        FFMPEG,
+        "-loglevel",
+        "error",
+        "-f",
+        "rawvideo",
+        "-pix_fmt",
+        "bgr24",
+        "-s",
+        f"{width}x{height}",
+        "-r",
+        str(fps),
+        "-i",
+        "-",
+        "-c:v",
+        "libx264",
+        "-preset",
+        "ultrafast",
+        "-tune",
+        "zerolatency",
+        "-pix_fmt",
+        "yuv420p",
+        # A keyframe (and so a fragment) every two seconds
+        "-g",
+        str(max(1, int(fps * 2))),
+        "-f",
+        "mp4",
+        "-movflags",
+        "frag_keyframe+empty_moov+default_base_moof",
+        "-",
+    ]
+
+
+def _read_exact(stream, size):
+    """Read exactly size bytes, or return None at end of stream."""
+    chunks = []
+    while size > 0:
+        chunk = stream.read(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def read_mp4_boxes(stream):
+    """
+    Yield the top-level boxes of an MP4 byte stream as they arrive.
+
+    Args:
+        stream: Binary file-like object (e.g. ffmpeg's stdout)
+
+    Yields:
+        tuple: (box_type: str, data: bytes including the box header)
+    """
+    while True:
+        header = _read_exact(stream, 8)
+        if header is None:
+            return
+        size, box_type = struct.unpack(">I4s", header)
+        if size == 1:
+            # 64-bit size follows the type
+            large = _read_exact(stream, 8)
+            if large is None:
+                return
+            header += large
+            size = struct.unpack(">Q", large)[0]
+        if size == 0:
+            # Box extends to the end of the stream
+            body = stream.read()
+        else:
+            body = _read_exact(stream, size - len(header))
+            if body is None:
+                return
+        yield box_type.decode("latin-1"), header + body
+
+
+class _EncoderRun:
+    """State of one encoder process and the clients attached to it."""
+
+    def __init__(self):
+        self.clients = set()
+        self.stopped = threading.Event()
+        self.init_segment = None
+        self.init_ready = threading.Event()
+        # Set once the end of stream went out (see H264Stream._end)
+        self.ended = False
+
+
+class H264Stream:
+    """Encode a FrameProducer's frames once and fan the fMP4 out to clients."""
+
+    def __init__(self, frame_producer, fps=10, command=None, client_queue_size=8):
+        """
+        Args:
+            frame_producer: FrameProducer supplying the frames
+            fps: Frame rate passed to the encoder
+            command: Callable (width, height, fps) -> argv for the encoder
+                process (default: ffmpeg_command)
+            client_queue_size: Fragments buffered per client before the
+                client starts losing fragments (default: 8)
+        """
+        self.frame_producer = frame_producer
+        self.fps = fps
+        self.command = command or ffmpeg_command
+        self.client_queue_size = client_queue_size
+        self._lock = threading.Lock()
+        self._run = None
+
+    def subscribe(self):
+        """
+        Generator yielding this client's fMP4 byte stream.
+
+        The encoder starts with the first subscriber and stops once the last
+        one disconnects.
+        """
+        client = queue.Queue(maxsize=self.client_queue_size)
+        with self._lock:
+            run = self._run
+            if run is None or run.stopped.is_set():
+                run = self._run = _EncoderRun()
+                threading.Thread(
+                    target=self._encode_loop, args=(run,), daemon=True
+                ).start()
+            run.clients.add(client)
+        try:
+            while not run.init_ready.wait(timeout=1.0):
+                if run.stopped.is_set():
+                    return
+            yield run.init_segment
+            while True:
+                fragment = client.get()
+                if fragment is None:
+                    return
+                yield fragment
+        finally:
+            with self._lock:
+                run.clients.discard(client)
+                if not run.clients:
+                    run.stopped.set()
+
+    def _encode_loop(self, run):
+        """Feed producer frames into the encoder until no client is left."""
+        last_id = 0
+        frame = None
+        while not run.stopped.is_set() and frame is None:
+            if not self.frame_producer.is_running():
+                break
+            last_id, frame = self.frame_producer.wait_for_frame(
+                last_id, timeout=1.0, copy=False
+            )
+        if frame is None:
+            self._end(run)
+            return
+        shape = frame.shape
+        try:
+            proc = subprocess.Popen(
+                self.command(shape[1], shape[0], self.fps),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+        except (OSError, TypeError) as e:
+            logger.error("Could not start H.264 encoder: %s", e)
+            self._end(run)
+            return
+        reader = threading.Thread(target=self._read_loop, args=(run, proc), daemon=True)
+        reader.start()
+        try:
+            while not run.stopped.is_set():
+                # Frames with another size (camera restarted) are skipped
+                if frame is not None and frame.shape == shape:
+                    proc.stdin.write(frame.data)
+                if not self.frame_producer.is_running():
+                    # The finally block ends the run for the clients
+                    break
+                frame_id, frame = self.frame_producer.wait_for_frame(
+                    last_id, timeout=1.0, copy=False
+                )
+                if frame_id == last_id:
+                    # Timed out: nothing new to send
+                    frame = None
+                last_id = frame_id
+        except (BrokenPipeError, ValueError):
+            logger.warning("H.264 encoder exited")
+        finally:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+            reader.join(timeout=5)
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+            self._end(run)
+
+    def _read_loop(self, run, proc):
+        """Split the encoder's output into the init segment and fragments."""
+        init_parts = []
+        moof = None
+        for box_type, data in read_mp4_boxes(proc.stdout):
+            if box_type in ("ftyp", "moov"):
+                init_parts.append(data)
+                if box_type == "moov":
+                    run.init_segment = b"".join(init_parts)
+                    run.init_ready.set()
+            elif box_type == "moof":
+                moof = data
+            elif box_type == "mdat" and moof is not None:
+                self._broadcast(run, moof + data)
+                moof = None
+        self._end(run)
+
+    def _end(self, run):
+        """Mark the run finished and tell its remaining clients, once."""
+        with self._lock:
+            if run.ended:
+                return
+            run.ended = True
+            run.stopped.set()
+            for client in run.clients:
+                # Drop queued fragments until the end of stream fits; clients
+                # only take from their queue, so this cannot fill up again
+                while True:
+                    try:
+                        client.put_nowait(None)
+                        break
+                    except queue.Full:
+                        try:
+                            client.get_nowait()
+                        except queue.Empty:
+                            pass
+
+    def _broadcast(self, run, fragment):
+        """Queue a fragment for every client of run, unless it has ended."""
+        with self._lock:
+            if run.ended:
+                return
+            for client in run.clients:
+                try:
+                    client.put_nowait(fragment)
+                except queue.Full:
+                    # The slow client loses this fragment and resumes at the
+                    # next keyframe
+                    pass
\ No newline at end of file
@@ -1,13 +1,25 @@
 import cv2
+import logging
 import numpy as np
 import os
+import time
+import threading
 import datetime
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from config import CONFIG
+from utils import parse_labels, JPEG_PARAMS
 
+logger = logging.getLogger(__name__)
 
 class ImageAnalyzer:
     """YOLO-based image analyzer for detecting objects in images."""
 
+    # Loaded networks keyed by (model path, config path, backend), shared between
+    # instances. Each entry carries a lock since setInput/forward mutate the net.
+    _NET_CACHE = {}
+    _NET_CACHE_LOCK = threading.Lock()
+
     def __init__(
         self,
         model_path=None,
@@ -16,6 +28,11 @@ class ImageAnalyzer:
         confidence_threshold=0.5,
         nms_threshold=0.4,
         target_objects=None,
+        backend=None,
+        input_size=None,
+        cache_threshold=8.0,
+        cache_ttl=10.0,
+        precision=None,
     ):
         """
         Initialize the ImageAnalyzer with YOLO model.
@@ -27,37 +44,219 @@ class ImageAnalyzer:
             confidence_threshold: Minimum confidence for detection (0.0 to 1.0)
             nms_threshold: Non-maximum suppression threshold
             target_objects: Object(s) to detect. Can be a string or list of strings (default: from config, "cat,person")
+            backend: DNN backend to use: "cuda", "opencl", "openvino", "cpu" or "auto" (default: from config, "auto")
+            input_size: Square network input size in pixels, a multiple of 32 (default: from config, 416)
+            cache_threshold: Largest per-cell difference (0-255) of a 16x16 thumbnail below which
+                a frame without targets is not analyzed again (0 or None disables)
+            cache_ttl: Seconds after which the cached verdict is discarded regardless of similarity
+            precision: Inference precision: "fp16", "fp32" or "auto" (FP16 on CUDA only)
+                (default: from config, "auto")
         """
-        self.model_path = model_path or "yolo_files/yolov3.weights"
-        self.config_path = config_path or "yolo_files/yolov3.cfg"
+        self.model_path = model_path or "yolo_files/yolov4-tiny.weights"
+        self.config_path = config_path or "yolo_files/yolov4-tiny.cfg"
         self.classes_path = classes_path or "yolo_files/coco.names"
         self.confidence_threshold = confidence_threshold
         self.nms_threshold = nms_threshold
-        
+        self.cache_threshold = cache_threshold
+        self.cache_ttl = cache_ttl
+
+        # Output directories already created by show_and_save_identified_image
+        self._created_dirs = set()
+
+        # Signature of the last analyzed frame, if it had no targets (see
+        # _cached_results)
+        self._last_sig = None
+        self._last_shape = None
+        self._last_time = 0.0
+
         # Use target_objects from config if not provided
         if target_objects is None:
             target_objects = CONFIG.get("TARGET_OBJECTS", "cat,person")
         
-        # Convert target_objects to a list for uniform handling
+        # Convert target_objects to a frozenset for uniform handling and O(1) lookups
         if isinstance(target_objects, str):
             # Handle comma-separated strings
-            self.target_objects = [obj.strip() for obj in target_objects.split(",")]
+            self.target_objects = parse_labels(target_objects)
         else:
-            self.target_objects = target_objects
+            self.target_objects = frozenset(target_objects)
+
+        if backend is None:
+            backend = CONFIG.get("ANALYZER_BACKEND", "auto")
+        if precision is None:
+            precision = CONFIG.get("ANALYZER_PRECISION", "auto")
+        self.precision = str(precision).lower()
+
+        # Preallocated NCHW input blob, refilled in place for every frame
+        if input_size is None:
+            input_size = CONFIG.get("ANALYZER_INPUT_SIZE", 416)
+        self._input_size = (int(input_size), int(input_size))
+        self._blob = np.empty(
+            (1, 3, self._input_size[1], self._input_size[0]), dtype=np.float32
+        )
+        self._resized = np.empty(
+            (self._input_size[1], self._input_size[0], 3), dtype=np.uint8
+        )
+        self._blob_params = None
+        if hasattr(cv2.dnn, "blobFromImageWithParams"):
+            scale = 1 / 255.0
+            self._blob_params = cv2.dnn.Image2BlobParams(
+                (scale, scale, scale), self._input_size, (0, 0, 0), True
+            )
 
-        # Load YOLO model
-        try:
-            self.net = cv2.dnn.readNet(self.model_path, self.config_path)
-        except Exception as e:
-            raise RuntimeError(f"Failed to load YOLO model: {e}")
+        # Load YOLO model, shared by all instances using the same files and backend
+        key = (
+            os.path.abspath(self.model_path),
+            os.path.abspath(self.config_path),
+            str(backend).lower(),
+            self.precision,
+        )
+        with ImageAnalyzer._NET_CACHE_LOCK:
+            entry = ImageAnalyzer._NET_CACHE.get(key)
+            if entry is None:
+                entry = self._load_net(backend)
+                ImageAnalyzer._NET_CACHE[key] = entry
+                # Also share it with requests for the backend it ended up on
+                confirmed = key[:2] + (entry[2],) + key[3:]
+                ImageAnalyzer._NET_CACHE.setdefault(confirmed, entry)
+        self.net, self._net_lock, self.backend, self._output_layers = entry
 
         # Load class labels
         if os.path.exists(self.classes_path):
             with open(self.classes_path, "r") as f:
-                self.classes = [line.strip() for line in f.readlines()]
+                self.classes = tuple(line.strip() for line in f)
         else:
-            self.classes = []
+            self.classes = ()
             print(f"Warning: Classes file not found at {self.classes_path}")
+        # Object array so labels for all kept detections are looked up in one call
+        self._labels_arr = np.array(self.classes, dtype=object)
+
+        # Class ids matching target_objects, used to filter YOLO output rows
+        self._target_class_ids = frozenset(
+            i for i, c in enumerate(self.classes) if c in self.target_objects
+        )
+        self._target_ids_array = np.array(
+            sorted(self._target_class_ids), dtype=np.int32
+        )
+
+    def _load_net(self, backend):
+        """
+        Read the YOLO network and prepare it for inference.
+
+        Args:
+            backend: Backend name passed to _configure_backend
+
+        Returns:
+            Cache entry tuple (net, lock, backend name, output layer names)
+        """
+        try:
+            self.net = cv2.dnn.readNet(self.model_path, self.config_path)
+        except Exception as e:
+            raise RuntimeError(f"Failed to load YOLO model: {e}")
+
+        # Output layer names never change after loading, so resolve them once
+        self._output_layers = self.net.getUnconnectedOutLayersNames()
+
+        # Graph fusion and Winograd convolutions (not available on older OpenCV)
+        try:
+            self.net.enableFusion(True)
+        except AttributeError:
+            pass
+        try:
+            self.net.enableWinograd(True)
+        except AttributeError:
+            pass
+
+        self.backend = self._configure_backend(backend)
+
+        return self.net, threading.Lock(), self.backend, self._output_layers
+
+    def _configure_backend(self, backend):
+        """
+        Select the DNN backend/target, falling back to plain CPU on failure.
+
+        An unusable backend only fails at the first forward pass, so every
+        candidate is confirmed with a warmup pass (which also spares the first
+        real frame the lazy allocation). "auto" tries CUDA, then the CPU;
+        OpenCL and OpenVINO are only used when requested explicitly.
+
+        The target precision follows self.precision: half precision halves the
+        memory traffic of every layer where the device supports it.
+
+        Args:
+            backend: "cuda", "opencl", "openvino", "cpu" or "auto"
+
+        Returns:
+            Name of the backend that passed the warmup
+        """
+        backend = (backend or "auto").lower()
+        half = self.precision == "fp16"
+
+        candidates = []
+        if backend == "openvino":
+            # Needs an OpenCV build with the OpenVINO (Inference Engine) backend
+            candidates.append(
+                (
+                    "openvino",
+                    cv2.dnn.DNN_BACKEND_INFERENCE_ENGINE,
+                    cv2.dnn.DNN_TARGET_CPU,
+                )
+            )
+        if backend in ("auto", "cuda") and self._have_cuda():
+            candidates.append(
+                (
+                    "cuda",
+                    cv2.dnn.DNN_BACKEND_CUDA,
+                    (
+                        cv2.dnn.DNN_TARGET_CUDA
+                        if self.precision == "fp32"
+                        else cv2.dnn.DNN_TARGET_CUDA_FP16
+                    ),
+                )
+            )
+        if backend == "opencl" and cv2.ocl.haveOpenCL():
+            candidates.append(
+                (
+                    "opencl",
+                    cv2.dnn.DNN_BACKEND_OPENCV,
+                    (
+                        cv2.dnn.DNN_TARGET_OPENCL_FP16
+                        if half
+                        else cv2.dnn.DNN_TARGET_OPENCL
+                    ),
+                )
+            )
+
+        for name, backend_id, target_id in candidates:
+            try:
+                self.net.setPreferableBackend(backend_id)
+                self.net.setPreferableTarget(target_id)
+                self._warmup()
+                return name
+            except Exception as e:
+                logger.warning("%s DNN backend unavailable: %s", name, e)
+
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        if half and hasattr(cv2.dnn, "DNN_TARGET_CPU_FP16"):
+            self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU_FP16)
+        else:
+            self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        try:
+            self._warmup()
+        except Exception as e:
+            logger.warning("YOLO warmup failed: %s", e)
+        return "cpu"
+
+    @staticmethod
+    def _have_cuda():
+        try:
+            return cv2.cuda.getCudaEnabledDeviceCount() > 0
+        except Exception:
+            return False
+
+    def _warmup(self):
+        """Run one forward pass on a blank input."""
+        self.net.setInput(np.zeros_like(self._blob))
+        self.net.forward(self._output_layers)
 
     def detect_objects(self, image):
         """
@@ -82,6 +281,33 @@ class ImageAnalyzer:
 
         return self._detect_in_image(img)
 
+    def detect_objects_batch(self, images):
+        """
+        Detect target objects in several images with a single forward pass.
+
+        Args:
+            images: List of numpy arrays and/or image file paths
+
+        Returns:
+            List with one detection list per input image (empty for unreadable inputs)
+        """
+        imgs = []
+        for image in images:
+            if isinstance(image, np.ndarray):
+                imgs.append(image)
+            elif isinstance(image, str):
+                imgs.append(cv2.imread(image))
+            else:
+                imgs.append(None)
+
+        valid = [i for i, img in enumerate(imgs) if img is not None]
+        results = [[] for _ in imgs]
+        if valid:
+            batch_results = self._detect_batch([imgs[i] for i in valid])
+            for i, detections in zip(valid, batch_results):
+                results[i] = detections
+        return results
+
     def _detect_in_image(self, img):
         """
         Internal method to detect target objects in a loaded image.
@@ -94,64 +320,229 @@ class ImageAnalyzer:
         """
         height, width = img.shape[:2]
 
-        # Prepare the image for YOLO
-        blob = cv2.dnn.blobFromImage(
-            img, 1 / 255.0, (416, 416), swapRB=True, crop=False
+        # Skip YOLO if the scene has not changed since a frame without targets
+        sig = None
+        if self.cache_threshold:
+            sig = cv2.resize(img, (16, 16), interpolation=cv2.INTER_AREA).astype(
+                np.int16
+            )
+            with self._net_lock:
+                cached = self._cached_results(sig, img.shape)
+            if cached is not None:
+                return cached
+
+        detections = self._forward(img)
+
+        results = self._postprocess(detections, width, height)
+        if sig is not None:
+            with self._net_lock:
+                # Only the "no targets" verdict is reused; boxes found on an
+                # earlier frame would be drawn onto (and saved with) a new one
+                self._last_sig = None if results else sig
+                self._last_shape = img.shape
+                self._last_time = time.monotonic()
+        return results
+
+    def detect_stream(self, frames):
+        """
+        Detect target objects in a stream of frames with a two-stage pipeline.
+
+        The forward pass of the next frame runs on a worker thread (OpenCV
+        releases the GIL) while the previous frame is post-processed here.
+
+        Args:
+            frames: Iterable of OpenCV images (numpy arrays)
+
+        Yields:
+            Tuples of (frame, detections) in input order
+        """
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pending = None
+            for img in frames:
+                future = pool.submit(self._forward, img)
+                if pending is not None:
+                    yield self._finish_stream_frame(*pending)
+                pending = (img, future)
+            if pending is not None:
+                yield self._finish_stream_frame(*pending)
+
+    def _finish_stream_frame(self, img, future):
+        height, width = img.shape[:2]
+        return img, self._postprocess(future.result(), width, height)
+
+    def _forward(self, img):
+        """
+        Run the YOLO forward pass for a single image.
+
+        Args:
+            img: OpenCV image (numpy array)
+
+        Returns:
+            List of raw output arrays, one per output layer
+        """
+        with self._net_lock:
+            self.net.setInput(self._make_blob(img))
+            return self.net.forward(self._output_layers)
+
+    def _cached_results(self, sig, shape):
+        """
+        Return an empty result if the frame looks like the last one without targets.
+
+        Every thumbnail cell must be within cache_threshold, so a small object
+        entering a single cell still forces a new forward pass. The caller
+        holds _net_lock.
+
+        Args:
+            sig: 16x16 int16 thumbnail of the current frame
+            shape: Shape of the current frame
+
+        Returns:
+            An empty list, or None on a cache miss
+        """
+        if self._last_sig is None or shape != self._last_shape:
+            return None
+        if time.monotonic() - self._last_time > self.cache_ttl:
+            return None
+        if np.abs(sig - self._last_sig).max() > self.cache_threshold:
+            return None
+        return []
+
+    def _make_blob(self, img):
+        """
+        Resize, scale to [0, 1] and swap BGR->RGB into the preallocated blob.
+
+        Args:
+            img: OpenCV image (numpy array)
+
+        Returns:
+            4-D NCHW float32 blob
+        """
+        if self._blob_params is not None:
+            return cv2.dnn.blobFromImageWithParams(img, self._blob, self._blob_params)
+        if img.ndim != 3 or img.shape[2] != 3:
+            return cv2.dnn.blobFromImage(
+                img, 1 / 255.0, self._input_size, swapRB=True, crop=False
+            )
+
+        # OpenCV < 4.8 cannot write into an existing blob: resize the uint8 image
+        # into a reused buffer, then swap, transpose and scale in one NumPy pass
+        cv2.resize(
+            img, self._input_size, dst=self._resized, interpolation=cv2.INTER_LINEAR
+        )
+        np.multiply(
+            self._resized[:, :, ::-1].transpose(2, 0, 1),
+            np.float32(1 / 255.0),
+            out=self._blob[0],
         )
-        self.net.setInput(blob)
+        return self._blob
 
-        # Get YOLO output layer names
-        layer_names = self.net.getLayerNames()
-        output_layers = [
-            layer_names[i - 1] for i in self.net.getUnconnectedOutLayers().flatten()
-        ]
+    def _detect_batch(self, imgs):
+        """
+        Internal method to detect target objects in a batch of loaded images.
+
+        Args:
+            imgs: List of OpenCV images (numpy arrays)
+
+        Returns:
+            List of detection result lists, one per image
+        """
+        blob = cv2.dnn.blobFromImages(
+            imgs, 1 / 255.0, self._input_size, swapRB=True, crop=False
+        )
+        with self._net_lock:
+            self.net.setInput(blob)
+            outputs = self.net.forward(self._output_layers)
+
+        # Each output holds the rows of every image; split them per batch index
+        per_layer = [out.reshape(len(imgs), -1, out.shape[-1]) for out in outputs]
+
+        results = []
+        for b, img in enumerate(imgs):
+            height, width = img.shape[:2]
+            results.append(
+                self._postprocess([out[b] for out in per_layer], width, height)
+            )
+        return results
 
-        # Perform forward pass
-        detections = self.net.forward(output_layers)
+    def _postprocess(self, detections, width, height):
+        """
+        Filter raw YOLO outputs by confidence and target class, then apply NMS.
+
+        Args:
+            detections: List of YOLO output arrays for a single image
+            width: Width of the original image
+            height: Height of the original image
 
-        # Collect all detections for NMS
+        Returns:
+            List of dictionaries containing detection results
+        """
+        # Collect all detections for NMS as contiguous arrays
         boxes = []
         confidences = []
         class_ids = []
 
         for output in detections:
-            for detection in output:
-                scores = detection[5:]
-                class_id = int(scores.argmax())
-                confidence = scores[class_id]
-
-                if confidence > self.confidence_threshold:
-                    # Check if the detected object is in our target list
-                    if self.classes and self.classes[class_id] in self.target_objects:
-                        center_x = int(detection[0] * width)
-                        center_y = int(detection[1] * height)
-                        w = int(detection[2] * width)
-                        h = int(detection[3] * height)
-
-                        x = int(center_x - w / 2)
-                        y = int(center_y - h / 2)
-
-                        boxes.append([x, y, w, h])
-                        confidences.append(float(confidence))
-                        class_ids.append(class_id)
-
-        # Apply Non-Maximum Suppression to remove overlapping boxes
-        results = []
-        if boxes:
+            scores = output[:, 5:]
+            ids = scores.argmax(axis=1)
+            scores = scores[np.arange(len(scores)), ids]
+
+            # Keep confident detections whose class is in our target list
+            mask = (scores > self.confidence_threshold) & np.isin(
+                ids, self._target_ids_array
+            )
+            if not mask.any():
+                continue
+
+            det = output[mask]
+            center_x = (det[:, 0] * width).astype(np.int32)
+            center_y = (det[:, 1] * height).astype(np.int32)
+            w = (det[:, 2] * width).astype(np.int32)
+            h = (det[:, 3] * height).astype(np.int32)
+
+            x = (center_x - w / 2).astype(np.int32)
+            y = (center_y - h / 2).astype(np.int32)
+
+            boxes.append(np.stack([x, y, w, h], axis=1))
+            confidences.append(scores[mask])
+            class_ids.append(ids[mask])
+
+        if not boxes:
+            return []
+
+        boxes = np.concatenate(boxes)
+        confidences = np.concatenate(confidences).astype(np.float32)
+        class_ids = np.concatenate(class_ids).astype(np.int32)
+
+        # Apply class-aware Non-Maximum Suppression to remove overlapping boxes
+        # (a single candidate cannot overlap anything, so skip it)
+        if len(boxes) == 1:
+            indices = [0]
+        elif hasattr(cv2.dnn, "NMSBoxesBatched"):
+            indices = cv2.dnn.NMSBoxesBatched(
+                boxes.tolist(),
+                confidences.tolist(),
+                class_ids.tolist(),
+                self.confidence_threshold,
+                self.nms_threshold,
+            )
+        else:
             indices = cv2.dnn.NMSBoxes(
-                boxes, confidences, self.confidence_threshold, self.nms_threshold
+                boxes.tolist(),
+                confidences.tolist(),
+                self.confidence_threshold,
+                self.nms_threshold,
             )
-            if len(indices) > 0:
-                for i in indices.flatten():
-                    results.append(
-                        {
-                            "label": self.classes[class_ids[i]],
-                            "confidence": confidences[i],
-                            "box": boxes[i],
-                        }
-                    )
 
-        return results
+        keep = np.asarray(indices, dtype=np.int64).flatten()
+        labels = self._labels_arr[class_ids[keep]]
+        return [
+            {"label": label, "confidence": confidence, "box": box}
+            for label, confidence, box in zip(
+                labels.tolist(),
+                confidences[keep].astype(float).tolist(),
+                boxes[keep].tolist(),
+            )
+        ]
 
     def draw_detections(self, img, results, color=(0, 255, 0), thickness=2):
         """
@@ -166,9 +557,25 @@ class ImageAnalyzer:
         Returns:
             Image with drawn bounding boxes
         """
+        if not results:
+            return img
+
+        # Draw all boxes with a single polylines call: corners (N, 4, 2)
+        boxes = np.array([obj["box"] for obj in results], dtype=np.int32)
+        x, y, w, h = boxes.T
+        corners = np.stack(
+            [
+                np.stack([x, y], axis=1),
+                np.stack([x + w, y], axis=1),
+                np.stack([x + w, y + h], axis=1),
+                np.stack([x, y + h], axis=1),
+            ],
+            axis=1,
+        )
+        cv2.polylines(img, list(corners), True, color, thickness)
+
         for obj in results:
             x, y, w, h = obj["box"]
-            cv2.rectangle(img, (x, y), (x + w, y + h), color, thickness)
             label = f"{obj['label']} {obj['confidence']:.2f}"
             cv2.putText(
                 img, label, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, thickness
@@ -176,19 +583,33 @@ class ImageAnalyzer:
         return img
 
     def show_and_save_identified_image(
-        self, image, notification_dir="notification_iamges", show_image=True
+        self,
+        image,
+        notification_dir="notification_iamges",
+        show_image=True,
+        return_jpeg=False,
+        results=None,
     ):
         """
         Detects target objects, draws bounding boxes, optionally visualizes, and saves the image with a timestamped filename if objects are detected.
 
         Args:
             image: numpy array (image data) or path to the image file (string)
-            notification_dir: Directory to save detected images
+            notification_dir: Directory to save detected images (None skips the disk write)
             show_image: Whether to display the image with detections
+            return_jpeg: Also return the encoded JPEG bytes so callers can send them without re-reading the file
+            results: Detections already computed for this image; skips a second detection pass
 
         Returns:
-            Tuple of (success: bool, save_path: str or None, num_objects: int)
+            Tuple of (success: bool, save_path: str or None, num_objects: int),
+            extended with jpeg_bytes (bytes or None) when return_jpeg is True
         """
+
+        def result(success, save_path, num_objects, jpeg_bytes=None):
+            if return_jpeg:
+                return success, save_path, num_objects, jpeg_bytes
+            return success, save_path, num_objects
+
         # Accept either a file path or a numpy ndarray
         if isinstance(image, np.ndarray):
             img = image
@@ -196,31 +617,181 @@ class ImageAnalyzer:
             img = cv2.imread(image)
             if img is None:
                 print(f"Error: Could not read image: {image}")
-                return False, None, 0
+                return result(False, None, 0)
         else:
             print(f"Error: Invalid image input type")
-            return False, None, 0
+            return result(False, None, 0)
 
-        results = self._detect_in_image(img)
+        if results is None:
+            results = self._detect_in_image(img)
         num_objects = len(results)
 
         if not results:
             print("No target objects detected.")
-            return False, None, 0
+            return result(False, None, 0)
 
         # Draw detections on image
         img = self.draw_detections(img, results)
 
+        # Encode once; the same bytes are written to disk and handed to the caller
+        ok, buffer = cv2.imencode(".jpg", img, JPEG_PARAMS)
+        if not ok:
+            print("Error encoding image")
+            return result(False, None, num_objects)
+        jpeg_bytes = buffer.tobytes()
+
+        if notification_dir is None:
+            return result(True, None, num_objects, jpeg_bytes)
 
         # Save to notification directory with timestamp
         try:
-            os.makedirs(notification_dir, exist_ok=True)
+            if notification_dir not in self._created_dirs:
+                os.makedirs(notification_dir, exist_ok=True)
+                self._created_dirs.add(notification_dir)
             timestamp = datetime.datetime.now().strftime("%y-%m-%d_%H-%M-%S")
             save_path = os.path.join(notification_dir, f"{timestamp}.jpg")
-            cv2.imwrite(save_path, img)
+            with open(save_path, "wb") as f:
+                f.write(jpeg_bytes)
             print(f"Saved detected image to: {save_path}")
             print(f"Number of objects detected: {num_objects}")
-            return True, save_path, num_objects
+            return result(True, save_path, num_objects, jpeg_bytes)
         except Exception as e:
             print(f"Error saving image: {e}")
-            return False, None, num_objects
\ No newline at end of file
+            return result(False, None, num_objects)
+
+
+class AsyncImageAnalyzer:
+    """Runs ImageAnalyzer detection on a single background worker thread.
+
+    OpenCV DNN releases the GIL during forward(), so frame capture and motion
+    detection keep running while YOLO works. Frames submitted while the worker
+    is busy wait in a bounded deque that drops the oldest entry on overflow,
+    so the worker always moves on to the newest ones. With batch_size > 1 the
+    waiting frames are analyzed together in a single forward pass.
+    """
+
+    def __init__(self, analyzer, max_pending=1, batch_size=1):
+        """
+        Initialize the wrapper.
+
+        Args:
+            analyzer: ImageAnalyzer instance used by the worker thread
+            max_pending: Number of frames allowed to wait while the worker is busy
+            batch_size: Maximum number of waiting frames analyzed in one pass
+        """
+        self.analyzer = analyzer
+        self.batch_size = max(1, batch_size)
+        self._pending = deque(maxlen=max(max_pending, self.batch_size))
+        self._wake = threading.Event()
+        self._stopped = False
+        self._current = None
+        # Set while frames are being analyzed, so other stages can back off
+        self.busy_event = threading.Event()
+        self._thread = threading.Thread(
+            target=self._worker, name="image-analyzer", daemon=True
+        )
+        self._thread.start()
+
+    def busy(self):
+        """Check if a previously submitted frame is still being processed."""
+        return self._current is not None or bool(self._pending)
+
+    def submit(self, image, callback=None):
+        """
+        Analyze an image in the background.
+
+        Args:
+            image: numpy array (image data) or path to the image file (string)
+            callback: Optional callable receiving the detections list. It runs on
+                the worker thread, so it may safely use the analyzer as well.
+
+        Returns:
+            Future resolving to the detections list. It is cancelled if a newer
+            frame displaces it before the worker gets to it.
+        """
+        future = Future()
+        if len(self._pending) == self._pending.maxlen:
+            try:
+                dropped = self._pending.popleft()
+            except IndexError:
+                pass  # The worker took it in the meantime
+            else:
+                dropped[0].cancel()
+        self._pending.append((future, image, callback))
+        self._wake.set()
+        return future
+
+    def shutdown(self, wait=True):
+        """Stop the worker thread, cancelling frames that have not started."""
+        self._stopped = True
+        while self._pending:
+            try:
+                self._pending.popleft()[0].cancel()
+            except IndexError:
+                break
+        self._wake.set()
+        if wait:
+            self._thread.join()
+
+    def _worker(self):
+        while not self._stopped:
+            self._wake.wait()
+            self._wake.clear()
+            while self._pending and not self._stopped:
+                batch = self._take_batch()
+                if not batch:
+                    continue
+                self._current = batch
+                self.busy_event.set()
+                try:
+                    if len(batch) == 1:
+                        future, image, callback = batch[0]
+                        try:
+                            future.set_result(self._run(image, callback))
+                        except Exception as e:
+                            future.set_exception(e)
+                    else:
+                        self._run_batch(batch)
+                finally:
+                    self._current = None
+            self.busy_event.clear()
+
+    def _take_batch(self):
+        """Pop up to batch_size pending entries that were not cancelled."""
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                entry = self._pending.popleft()
+            except IndexError:
+                break
+            if entry[0].set_running_or_notify_cancel():
+                batch.append(entry)
+        return batch
+
+    def _run_batch(self, batch):
+        try:
+            results = self.analyzer.detect_objects_batch([e[1] for e in batch])
+        except Exception as e:
+            print(f"Error in background image analysis: {e}")
+            for future, _, _ in batch:
+                future.set_exception(e)
+            return
+
+        for (future, _, callback), detections in zip(batch, results):
+            try:
+                if callback is not None:
+                    callback(detections)
+                future.set_result(detections)
+            except Exception as e:
+                print(f"Error in background image analysis: {e}")
+                future.set_exception(e)
+
+    def _run(self, image, callback):
+        try:
+            detections = self.analyzer.detect_objects(image)
+            if callback is not None:
+                callback(detections)
+            return detections
+        except Exception as e:
+            print(f"Error in background image analysis: {e}")
+            raise
\ No newline at end of file
@@ -1,15 +1,22 @@
+from config import CONFIG
+
+# eventlet has to patch the stdlib before anything else imports threading/socket
+if CONFIG.get("WEB_ASYNC_MODE") == "eventlet":
+    import eventlet
+
+    eventlet.monkey_patch()
+
 import time
 import os
 import threading
-import signal
-import sys
-from queue import Queue
+import functools
+import atexit
+import cv2
 from frame_producer import FrameProducer
 from motion_detector import MotionDetector
-from notifications import TelegramNotifier
-from image_analyzer import ImageAnalyzer
-from utils import save_frame
-from config import CONFIG
+from notifications import TelegramNotifier, NotificationDispatcher, make_session
+from image_analyzer import ImageAnalyzer, AsyncImageAnalyzer
+from utils import parse_labels, format_labels, JPEG_PARAMS
 from web_server import app, socketio, emit_motion_event
 import logging
 
@@ -22,32 +29,100 @@ detector_instance = None
 frame_producer_instance = None
 
 
-def motion_detection_worker(event_queue):
-    """Worker function that runs motion detection in a separate thread."""
-    global detector_instance, frame_producer_instance
+def handle_detections(
+    event, target, target_objects, detections, analyzer, notifier, dispatcher
+):
+    """Save, notify and publish a motion event once the analyzer has finished.
+
+    Runs on the analyzer worker thread (see AsyncImageAnalyzer.submit);
+    notifications are handed to dispatcher.
+    """
+    logger.debug("Analyzer returned %d detections", len(detections))
+
+    # Per-detection details are only built when debug logging is on
+    if detections and logger.isEnabledFor(logging.DEBUG):
+        for d in detections:
+            logger.debug(
+                " - detection: label=%s confidence=%.2f box=%s",
+                d.get("label"),
+                d.get("confidence"),
+                d.get("box"),
+            )
 
-    detector = MotionDetector(
-        frame_producer=frame_producer_instance,
-        sensitivity=CONFIG.get("SENSITIVITY", 25),
-        min_area=CONFIG.get("MIN_AREA", 500),
-    )
-    detector_instance = detector
+    # Split detections into target matches and other labels in a single pass
+    matches = []
+    matched_labels = set()
+    other_labels = set()
+    for d in detections:
+        label = d.get("label")
+        if label in target_objects:
+            matches.append(d)
+            matched_labels.add(label)
+        else:
+            other_labels.add(label)
+
+    if matches:
+        logger.info(
+            "Target objects detected: %s (%d detections). Saving image with detections.",
+            ", ".join(matched_labels),
+            len(matches),
+        )
 
-    print("Motion detector started in background thread")
+        # Use ImageAnalyzer to save the image with bounding boxes to frames directory
+        success, saved_path, num_detected, jpeg_bytes = (
+            analyzer.show_and_save_identified_image(
+                target,
+                notification_dir=CONFIG.get("FRAME_DIR", "frames"),
+                show_image=False,
+                return_jpeg=True,
+                results=matches,
+            )
+        )
 
-    try:
-        for event in detector.run():
-            # Put the event in the queue for the main thread to process
-            event_queue.put(event)
-    except Exception as e:
-        print(f"Error in motion detection: {e}")
+        if success and saved_path:
+            # Send the annotated image straight from memory (already encoded)
+            caption = f"{', '.join(matched_labels)} detected at {event['timestamp']}: {num_detected} object(s)"
+            if notifier.is_configured():
+                # Upload in the background so a slow network never stalls analysis
+                dispatcher.enqueue(notifier, jpeg_bytes, caption)
+            else:
+                logger.info("Telegram notifier not configured; skipping notification.")
+
+            # Emit event to web interface; the dict is stored and broadcast
+            # as-is, and the same encoded bytes as saved and sent are served
+            # from memory at image_url
+            web_event = {
+                "timestamp": event["timestamp"],
+                "frame_path": saved_path,
+                "image_url": f"/frames/{os.path.basename(saved_path)}",
+            }
+            emit_motion_event(web_event, jpeg=jpeg_bytes)
+        else:
+            logger.error("Failed to save detected image")
+    else:
+        if other_labels:
+            logger.info(
+                "Motion detected but no target objects found. Detected: %s (looking for: %s)",
+                ", ".join(other_labels),
+                format_labels(target_objects),
+            )
+        else:
+            logger.info(
+                "Motion detected but no objects recognized by YOLO (looking for: %s)",
+                format_labels(target_objects),
+            )
 
 
 def main():
-    global frame_producer_instance
+    global detector_instance, frame_producer_instance
 
     # Initialize frame producer
-    frame_producer = FrameProducer(camera_index=CONFIG.get("CAMERA_INDEX", 0))
+    frame_producer = FrameProducer(
+        camera_index=CONFIG.get("CAMERA_INDEX", 0),
+        target_fps=CONFIG.get("CAPTURE_FPS", 10),
+        buffer_size=CONFIG.get("CAPTURE_BUFFER_SIZE", 1),
+        jpeg_encoder=CONFIG.get("JPEG_ENCODER", "cpu"),
+    )
     frame_producer.start()
     frame_producer_instance = frame_producer
 
@@ -70,129 +145,121 @@ def main():
     # wait briefly for first frame to be captured
     time.sleep(0.5)
 
-    detector = MotionDetector(
-        frame_producer=frame_producer,
-        sensitivity=CONFIG.get("SENSITIVITY", 25),
-        min_area=CONFIG.get("MIN_AREA", 500),
-        save_frames=False,  # let main decide when to save
-    )
+    # Shared HTTP session so notifications reuse one keep-alive TLS connection
+    http = make_session()
+    atexit.register(http.close)
+
+    # Notification uploads are network bound; send them from a background thread.
+    # Registered after the session so it is flushed before the session closes.
+    dispatcher = NotificationDispatcher()
+    atexit.register(dispatcher.shutdown, timeout=5)
+
     notifier = TelegramNotifier(
         token=CONFIG.get("TELEGRAM_TOKEN"),
         chat_id=CONFIG.get("TELEGRAM_CHAT_ID"),
+        session=http,
     )
     analyzer = ImageAnalyzer(
         model_path=CONFIG.get("ANALYZER_MODEL_PATH"),
         config_path=CONFIG.get("ANALYZER_CONFIG_PATH"),
         classes_path=CONFIG.get("ANALYZER_CLASSES_PATH"),
+        backend=CONFIG.get("ANALYZER_BACKEND"),
+        input_size=CONFIG.get("ANALYZER_INPUT_SIZE"),
+        precision=CONFIG.get("ANALYZER_PRECISION"),
+    )
+    # Run YOLO on a worker thread so the motion loop keeps consuming frames
+    # Motion events arriving while YOLO is busy are analyzed as one batch
+    batch_size = CONFIG.get("ANALYZER_BATCH_SIZE", 1)
+    async_analyzer = AsyncImageAnalyzer(
+        analyzer, max_pending=batch_size, batch_size=batch_size
     )
 
+    detector = MotionDetector(
+        frame_producer=frame_producer,
+        sensitivity=CONFIG.get("SENSITIVITY", 25),
+        min_area=CONFIG.get("MIN_AREA", 500),
+        save_frames=False,  # let main decide when to save
+        # The detector rate-limits events itself; no extra pause in the loop
+        cooldown_seconds=float(CONFIG.get("EVENT_COOLDOWN", 1.0)),
+        work_width=CONFIG.get("MOTION_WORK_WIDTH", 320),
+        use_gpu=CONFIG.get("MOTION_USE_GPU", False),
+        background_model=CONFIG.get("MOTION_BACKGROUND", "mog2"),
+        # Thin out motion detection while YOLO is busy to leave it the CPU
+        analysis_busy=async_analyzer.busy_event,
+        busy_frame_stride=CONFIG.get("MOTION_BUSY_STRIDE", 2),
+        # Foreground-EMA hysteresis; 0 disables it (one event per cooldown)
+        hi_thresh=CONFIG.get("MOTION_HI_THRESH", 0) or None,
+        lo_thresh=CONFIG.get("MOTION_LO_THRESH", 0) or None,
+        # Weak motion is not worth a YOLO pass
+        min_analyze_area=CONFIG.get("MIN_ANALYZE_AREA", 1500),
+    )
+    detector_instance = detector
+
+    # Create output directories once instead of on every event
+    os.makedirs(CONFIG.get("FRAME_DIR", "frames"), exist_ok=True)
+
+    # Optionally keep the raw motion frames to inspect what the camera sees
+    save_debug_frames = CONFIG.get("DEBUG_SAVE_FRAMES", False)
+    debug_dir = "debug_frames"
+    if save_debug_frames:
+        os.makedirs(debug_dir, exist_ok=True)
+
     print("Starting motion detector. Press Ctrl+C to stop.")
     try:
         for event in detector.run():
-            # Reload target objects from CONFIG each iteration (allows dynamic updates)
-            target_objects_str = CONFIG.get("TARGET_OBJECTS", "cat")
-            target_objects = [obj.strip() for obj in target_objects_str.split(",")]
+            # Reload target objects from CONFIG each iteration (allows dynamic updates);
+            # parse_labels caches the frozenset per distinct string
+            target_objects = parse_labels(CONFIG.get("TARGET_OBJECTS", "cat"))
 
-            logger.info("Received motion event: %s", event.get("timestamp"))
-            # Detector yields either a saved path or a raw frame ndarray
-            frame = None
+            logger.debug("Received motion event: %s", event.get("timestamp"))
+            # Detector yields the raw frame ndarray, plus its path when saved
+            frame = event.get("frame")
             frame_path = event.get("frame_path")
             if frame_path:
                 logger.info("Motion detected and saved by detector: %s", frame_path)
-                frame = None
             else:
                 logger.info(
                     "Motion detected (in-memory frame) at %s", event["timestamp"]
                 )
-                frame = event.get("frame")
 
-            # DEBUG: Save frame to inspect what camera sees
-            if frame is not None:
-                debug_dir = "debug_frames"
-                os.makedirs(debug_dir, exist_ok=True)
+            # DEBUG: Save frame to inspect what camera sees (unless the detector
+            # already wrote this exact raw frame to disk)
+            if save_debug_frames and frame is not None and not frame_path:
                 debug_path = os.path.join(
-                    debug_dir, f"debug_{event['timestamp'].replace(':', '-')}.jpg"
+                    debug_dir, f"debug_{event['fs_timestamp']}.jpg"
                 )
-                import cv2 as _cv2
-
-                _cv2.imwrite(debug_path, frame)
+                cv2.imwrite(debug_path, frame, JPEG_PARAMS)
                 logger.info("DEBUG: Saved frame to %s", debug_path)
 
-            # Analyze the frame (pass ndarray or path directly to ImageAnalyzer)
-            target = frame if frame is not None else frame_path
+            # Decode a path-only event once here, so the analyzer and
+            # show_and_save_identified_image both reuse the same ndarray
+            if frame is None and frame_path:
+                frame = cv2.imread(frame_path)
+                if frame is None:
+                    logger.warning("Could not read motion frame: %s", frame_path)
+                    continue
+            target = frame
             logger.info(
-                "Analyzing frame for target objects: %s", ", ".join(target_objects)
+                "Analyzing frame for target objects: %s",
+                format_labels(target_objects),
             )
-            detections = analyzer.detect_objects(target)
-            logger.info("Analyzer returned %d detections", len(detections))
-
-            # Check for any target objects
-            if detections:
-                for d in detections:
-                    logger.info(
-                        " - detection: label=%s confidence=%.2f box=%s",
-                        d.get("label"),
-                        d.get("confidence"),
-                        d.get("box"),
-                    )
-
-            # Find matches - any detected object that's in our target list
-            matches = [d for d in detections if d.get("label") in target_objects]
-
-            if matches:
-                matched_labels = list(set([d.get("label") for d in matches]))
+            if async_analyzer.busy():
                 logger.info(
-                    "Target objects detected: %s (%d detections). Saving image with detections.",
-                    ", ".join(matched_labels),
-                    len(matches),
+                    "Analyzer still busy; motion event %s replaces any pending one",
+                    event["timestamp"],
                 )
-
-                # Use ImageAnalyzer to save the image with bounding boxes to frames directory
-                success, saved_path, num_detected = (
-                    analyzer.show_and_save_identified_image(
-                        target,
-                        notification_dir=CONFIG.get("FRAME_DIR", "frames"),
-                        show_image=False,
-                    )
-                )
-
-                if success and saved_path:
-                    # Send the annotated image from frames folder
-                    caption = f"{', '.join(matched_labels)} detected at {event['timestamp']}: {num_detected} object(s)"
-                    if notifier.is_configured():
-                        notifier.send_photo(saved_path, caption=caption)
-                    else:
-                        logger.info(
-                            "Telegram notifier not configured; skipping notification."
-                        )
-
-                    # Emit event to web interface
-                    web_event = {
-                        "timestamp": event["timestamp"],
-                        "frame_path": saved_path,
-                    }
-                    emit_motion_event(web_event)
-                else:
-                    logger.error("Failed to save detected image")
-            else:
-                detected_labels = (
-                    list(set([d.get("label") for d in detections]))
-                    if detections
-                    else []
-                )
-                if detected_labels:
-                    logger.info(
-                        "Motion detected but no target objects found. Detected: %s (looking for: %s)",
-                        ", ".join(detected_labels),
-                        ", ".join(target_objects),
-                    )
-                else:
-                    logger.info(
-                        "Motion detected but no objects recognized by YOLO (looking for: %s)",
-                        ", ".join(target_objects),
-                    )
-
-            time.sleep(1)
+            async_analyzer.submit(
+                target,
+                callback=functools.partial(
+                    handle_detections,
+                    event,
+                    target,
+                    target_objects,
+                    analyzer=analyzer,
+                    notifier=notifier,
+                    dispatcher=dispatcher,
+                ),
+            )
     except KeyboardInterrupt:
         print("\nStopping...")
     finally:
@@ -203,6 +270,7 @@ def main():
                 detector_instance.running = False
             if frame_producer_instance:
                 frame_producer_instance.stop()
+            async_analyzer.shutdown(wait=False)
 
             # Give threads time to cleanup
             print("Shutdown complete.")
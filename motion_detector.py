@@ -3,11 +3,77 @@ import cv2
 import os
 import datetime
 import logging
+import numpy as np
+import motion_kernels
 from utils import ensure_dir, save_frame
 
 logger = logging.getLogger(__name__)
 
 
+def _cuda_available():
+    """Check whether OpenCV was built with CUDA and sees a device."""
+    try:
+        return cv2.cuda.getCudaEnabledDeviceCount() > 0
+    except (AttributeError, cv2.error):
+        return False
+
+
+class _CudaMotionPipeline:
+    """Runs the per-frame motion ops on a CUDA device via cv2.cuda.
+
+    Each frame is uploaded once and stays on the device through grayscale,
+    blur, background model and dilation; only the final mask is downloaded.
+    """
+
+    def __init__(self, blur_ksize, sensitivity, use_mog2):
+        self.sensitivity = sensitivity
+        self.stream = cv2.cuda.Stream()
+        self._frame = cv2.cuda.GpuMat()
+        self._blur = cv2.cuda.createGaussianFilter(
+            cv2.CV_8UC1, cv2.CV_8UC1, blur_ksize, 0
+        )
+        self._dilate = cv2.cuda.createMorphologyFilter(
+            cv2.MORPH_DILATE, cv2.CV_8UC1, np.ones((3, 3), np.uint8), (-1, -1), 2
+        )
+        self._mog2 = None
+        if use_mog2:
+            self._mog2 = cv2.cuda.createBackgroundSubtractorMOG2(
+                history=500, varThreshold=sensitivity, detectShadows=False
+            )
+        self._avg = None
+
+    def apply(self, frame):
+        """
+        Compute the motion mask of a BGR frame.
+
+        Returns:
+            tuple: (mask ndarray, frame_delta GpuMat), or (None, None) when the
+                   frame only initialised the running-average background
+        """
+        self._frame.upload(frame, self.stream)
+        gray = cv2.cuda.cvtColor(self._frame, cv2.COLOR_BGR2GRAY, stream=self.stream)
+        gray = self._blur.apply(gray, stream=self.stream)
+
+        if self._mog2 is not None:
+            delta = self._mog2.apply(gray, -1.0, self.stream)
+            mask = delta
+        else:
+            if self._avg is None:
+                self._avg = gray
+                return None, None
+            self._avg = cv2.cuda.addWeighted(
+                self._avg, 0.5, gray, 0.5, 0, stream=self.stream
+            )
+            delta = cv2.cuda.absdiff(gray, self._avg, stream=self.stream)
+            _, mask = cv2.cuda.threshold(
+                delta, self.sensitivity, 255, cv2.THRESH_BINARY, stream=self.stream
+            )
+
+        mask = self._dilate.apply(mask, stream=self.stream)
+        self.stream.waitForCompletion()
+        return mask.download(), delta
+
+
 class MotionDetector:
     """Motion detector that consumes frames from a FrameProducer or camera."""
 
@@ -20,6 +86,15 @@ class MotionDetector:
         min_motion_frames=2,
         cooldown_seconds=2,
         save_frames=True,
+        work_width=320,
+        blur_ksize=5,
+        use_gpu=False,
+        background_model="mog2",
+        analysis_busy=None,
+        busy_frame_stride=2,
+        hi_thresh=None,
+        lo_thresh=None,
+        min_analyze_area=0,
     ):
         self.frame_producer = frame_producer
         self.camera_index = camera_index
@@ -31,6 +106,73 @@ class MotionDetector:
         self.min_motion_frames = min_motion_frames
         self.cooldown_seconds = cooldown_seconds
         self.save_frames = save_frames
+        # Frames wider than this are downscaled before motion analysis; the
+        # original frame is still the one saved and handed to consumers
+        self.work_width = work_width
+        self._src_shape = None
+        self._work_dsize = None
+        self._area_scale = 1.0
+        # Per-frame scratch buffers for the CPU path, (re)allocated only when
+        # the working resolution changes (see _allocate_buffers)
+        self._small = None
+        self._gray = None
+        self._blur = None
+        self._delta = None
+        self._thresh = None
+        self._dilated = None
+        # A small kernel denoises the downscaled frame as well as 21x21 did
+        # at full resolution, for a fraction of the cost
+        self.blur_ksize = (blur_ksize, blur_ksize)
+        # With a GPU requested, prefer a CUDA device (cv2.cuda) and otherwise
+        # run the elementwise/stencil ops through OpenCV's T-API (OpenCL)
+        self._cuda = None
+        if use_gpu and _cuda_available():
+            self._cuda = _CudaMotionPipeline(
+                self.blur_ksize, sensitivity, background_model == "mog2"
+            )
+            logger.info("Running motion detection on CUDA")
+        self.use_gpu = bool(use_gpu) and self._cuda is None and cv2.ocl.haveOpenCL()
+        if use_gpu and self._cuda is None and not self.use_gpu:
+            logger.warning("No CUDA or OpenCL device; running motion detection on CPU")
+        if self.use_gpu:
+            cv2.ocl.setUseOpenCL(True)
+        # "mog2" uses OpenCV's per-pixel Gaussian mixture model, which adapts to
+        # lighting changes; "average" keeps the running-average frame difference
+        self.background_model = background_model
+        if background_model == "mog2":
+            self.bg_subtractor = cv2.createBackgroundSubtractorMOG2(
+                history=500, varThreshold=sensitivity, detectShadows=False
+            )
+        elif background_model == "average":
+            self.bg_subtractor = None
+        else:
+            raise ValueError(f"Unknown background model: {background_model}")
+        # With numba installed, the "average" model updates the background,
+        # diffs and thresholds in one fused pass (see motion_kernels)
+        self.fused_kernel = (
+            motion_kernels.HAVE_NUMBA
+            and self.bg_subtractor is None
+            and not self.use_gpu
+        )
+        # While this threading.Event is set (object analysis in flight), only
+        # every busy_frame_stride-th producer frame is processed
+        self.analysis_busy = analysis_busy
+        self.busy_frame_stride = max(1, busy_frame_stride)
+        # Optional hysteresis on an EMA of the foreground pixel count (in
+        # full-resolution pixels): an event fires once when the EMA rises past
+        # hi_thresh, and the detector re-arms only after it drops below
+        # lo_thresh. Continuous activity (foliage, shadows) then triggers one
+        # analysis instead of one per cooldown. None disables the gate.
+        self.hi_thresh = hi_thresh
+        self.lo_thresh = (
+            lo_thresh if lo_thresh is not None or hi_thresh is None else hi_thresh / 2
+        )
+        self._ema_fg = 0.0
+        self._armed = True
+        # Motion whose largest region is below this (full-resolution pixels)
+        # yields no event, so it neither starts the cooldown nor disarms the
+        # hysteresis gate ahead of a real event
+        self.min_analyze_area = min_analyze_area
 
     def run(self):
         """Generator that yields motion events."""
@@ -47,18 +189,37 @@ class MotionDetector:
         motion_counter = 0
         last_saved = None
 
+        last_frame_id = 0
+        skipped = 0
+
         self.running = True
         try:
             while self.running:
-                frame = None
+                frame_id, frame = last_frame_id, None
                 try:
-                    frame = self.frame_producer.get_frame()
+                    # Block until the producer publishes a fresh frame, asking
+                    # it to decode one now; the id is read together with the
+                    # frame. No copy needed since published frames are never
+                    # rewritten
+                    frame_id, frame = self.frame_producer.wait_for_frame(
+                        last_frame_id, copy=False, request=True
+                    )
                 except Exception:
-                    logger.exception("FrameProducer.get_frame() raised")
+                    logger.exception("FrameProducer.wait_for_frame() raised")
 
-                if frame is None:
-                    time.sleep(0.01)
+                if frame is None or frame_id == last_frame_id:
+                    # Timed out or the producer stopped: never re-process a
+                    # stale frame, and only back off when nothing can wake us
+                    if not self.frame_producer.is_running():
+                        time.sleep(0.01)
                     continue
+                last_frame_id = frame_id
+
+                if self.analysis_busy is not None and self.analysis_busy.is_set():
+                    skipped += 1
+                    if skipped < self.busy_frame_stride:
+                        continue
+                skipped = 0
 
                 avg, motion_counter, last_saved, event = self._process_frame(
                     frame, avg, motion_counter, last_saved
@@ -89,34 +250,132 @@ class MotionDetector:
         finally:
             cap.release()
 
+    def _downscale(self, frame):
+        """Return the frame resized to the working resolution (or as is)."""
+        shape = frame.shape[:2]
+        if shape != self._src_shape:
+            # Recompute the working size only when the camera resolution changes
+            h, w = shape
+            if self.work_width and w > self.work_width:
+                work_h = max(1, round(h * self.work_width / w))
+                self._work_dsize = (self.work_width, work_h)
+                self._area_scale = (w * h) / (self.work_width * work_h)
+            else:
+                self._work_dsize = None
+                self._area_scale = 1.0
+            self._src_shape = shape
+            self._allocate_buffers(shape)
+
+        if self._work_dsize is None:
+            return frame
+        return cv2.resize(
+            frame, self._work_dsize, dst=self._small, interpolation=cv2.INTER_AREA
+        )
+
+    def _allocate_buffers(self, shape):
+        """Allocate the CPU scratch buffers for frames of the given source shape."""
+        if self.use_gpu:
+            return  # UMat results live on the device and are allocated by OpenCV
+        if self._work_dsize is not None:
+            w, h = self._work_dsize
+            self._small = np.empty((h, w, 3), dtype=np.uint8)
+        else:
+            h, w = shape
+            self._small = None
+        self._gray = np.empty((h, w), dtype=np.uint8)
+        self._blur = np.empty((h, w), dtype=np.uint8)
+        self._delta = np.empty((h, w), dtype=np.uint8)
+        self._thresh = np.empty((h, w), dtype=np.uint8)
+        self._dilated = np.empty((h, w), dtype=np.uint8)
+
+    def _motion_mask(self, small, avg):
+        """Compute the dilated foreground mask of a working-resolution frame.
+
+        Returns:
+            tuple: (avg, thresh, frame_delta); thresh and frame_delta are None
+                   when the frame only initialised the background
+        """
+        if self.use_gpu:
+            small = cv2.UMat(small)
+        # On the CPU path every step writes into a preallocated buffer (the
+        # buffers are None on the UMat path, letting OpenCV allocate)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        gray = cv2.GaussianBlur(gray, self.blur_ksize, 0, dst=self._blur)
+
+        if self.bg_subtractor is not None:
+            # The subtractor keeps its own model and returns a binary mask
+            frame_delta = self.bg_subtractor.apply(gray, fgmask=self._thresh)
+            thresh = frame_delta
+        else:
+            if avg is None:
+                # The background stays uint8; copy it out of the scratch buffer
+                # (UMat results are already fresh device buffers)
+                if not self.use_gpu:
+                    gray = gray.copy()
+                return gray, None, None
+
+            if self.fused_kernel:
+                # 0.5 weight (shift=1), matching the OpenCV path below
+                motion_kernels.update_and_threshold(
+                    gray, avg, self._delta, self._thresh, 1, self.sensitivity
+                )
+                frame_delta = self._delta
+                thresh = self._thresh
+            else:
+                # Same 0.5 running average as before, in uint8 SIMD paths and
+                # without the extra convertScaleAbs pass over a float buffer
+                cv2.addWeighted(avg, 0.5, gray, 0.5, 0, dst=avg)
+                frame_delta = cv2.absdiff(gray, avg, dst=self._delta)
+                _, thresh = cv2.threshold(
+                    frame_delta,
+                    self.sensitivity,
+                    255,
+                    cv2.THRESH_BINARY,
+                    dst=self._thresh,
+                )
+        thresh = cv2.dilate(thresh, None, dst=self._dilated, iterations=2)
+        return avg, thresh, frame_delta
+
     def _process_frame(self, frame, avg, motion_counter, last_saved):
         """Process a single frame and return updated state and optional event.
 
         Returns:
             tuple: (avg, motion_counter, last_saved, event)
-                   event is None unless motion is detected and cooldown passed
+                   event is None unless motion of at least min_analyze_area
+                   is detected, cooldown passed and (with hi_thresh set) the
+                   hysteresis gate is armed
         """
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        gray = cv2.GaussianBlur(gray, (21, 21), 0)
-
-        if avg is None:
-            return gray.astype("float"), motion_counter, last_saved, None
-
-        cv2.accumulateWeighted(gray, avg, 0.5)
-        frame_delta = cv2.absdiff(gray, cv2.convertScaleAbs(avg))
+        small = self._downscale(frame)
+        if self._cuda is not None:
+            # The CUDA pipeline keeps its own background model on the device
+            thresh, frame_delta = self._cuda.apply(small)
+        else:
+            avg, thresh, frame_delta = self._motion_mask(small, avg)
+        if thresh is None:
+            return avg, motion_counter, last_saved, None
 
-        _, thresh = cv2.threshold(frame_delta, self.sensitivity, 255, cv2.THRESH_BINARY)
-        thresh = cv2.dilate(thresh, None, iterations=2)
-        contours, _ = cv2.findContours(
-            thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
-        )
+        # Largest moving region in full-resolution pixels, reported with the
+        # event so consumers can skip expensive analysis on weak motion.
+        # Early-out when there are too few foreground pixels for any blob to
+        # reach min_area; otherwise one labelling pass yields all blob areas.
+        motion_area = 0.0
+        fg_pixels = cv2.countNonZero(thresh) * self._area_scale
+        if fg_pixels >= self.min_area:
+            _, _, stats, _ = cv2.connectedComponentsWithStats(thresh, connectivity=8)
+            if self.use_gpu:
+                stats = stats.get()
+            if len(stats) > 1:
+                motion_area = float(stats[1:, cv2.CC_STAT_AREA].max())
+                motion_area *= self._area_scale
+        motion = motion_area >= self.min_area
 
-        motion = False
-        for c in contours:
-            if cv2.contourArea(c) < self.min_area:
-                continue
-            motion = True
-            break
+        if self.hi_thresh is not None:
+            self._ema_fg = 0.9 * self._ema_fg + 0.1 * fg_pixels
+            if not self._armed and self._ema_fg < self.lo_thresh:
+                logger.debug(
+                    "Foreground EMA %.0f below low threshold; re-armed", self._ema_fg
+                )
+                self._armed = True
 
         now = datetime.datetime.now()
         if motion:
@@ -128,7 +387,11 @@ class MotionDetector:
             motion_counter = 0
 
         event = None
-        if motion_counter >= self.min_motion_frames:
+        gated = self.hi_thresh is not None and (
+            not self._armed or self._ema_fg < self.hi_thresh
+        )
+        weak = motion_area < self.min_analyze_area
+        if motion_counter >= self.min_motion_frames and not gated and not weak:
             enough_time = False
             if last_saved is None:
                 enough_time = True
@@ -138,19 +401,43 @@ class MotionDetector:
 
             if enough_time:
                 timestamp = now.isoformat()
+                # Filesystem-safe variant, computed once for all consumers
+                fs_timestamp = timestamp.replace(":", "-")
+                if isinstance(frame_delta, cv2.cuda.GpuMat):
+                    frame_delta = frame_delta.download()
+                frame_delta_mean = float(cv2.mean(frame_delta)[0])
                 if self.save_frames:
-                    filename = f"motion_{timestamp.replace(':', '-')}.jpg"
+                    filename = f"motion_{fs_timestamp}.jpg"
                     path = os.path.join(self.frame_dir, filename)
                     try:
                         save_frame(frame, path)
                         logger.info("Motion event saved: %s", path)
-                        event = {"timestamp": timestamp, "frame_path": path}
+                        event = {
+                            "timestamp": timestamp,
+                            "fs_timestamp": fs_timestamp,
+                            "area": motion_area,
+                            "frame_delta_mean": frame_delta_mean,
+                            "frame_path": path,
+                            # Keep the decoded frame so consumers can skip a
+                            # file read + JPEG decode of what was just written
+                            "frame": frame.copy(),
+                        }
                         last_saved = now
                     except Exception:
                         logger.exception("Failed to save motion frame")
                 else:
                     logger.info("Motion event yielded (in-memory) at %s", timestamp)
-                    event = {"timestamp": timestamp, "frame": frame}
+                    # Hand the consumer its own copy; the frame may be a shared
+                    # FrameProducer buffer that is still being read here
+                    event = {
+                        "timestamp": timestamp,
+                        "fs_timestamp": fs_timestamp,
+                        "area": motion_area,
+                        "frame_delta_mean": frame_delta_mean,
+                        "frame": frame.copy(),
+                    }
                     last_saved = now
 
+        if event is not None and self.hi_thresh is not None:
+            self._armed = False
         return avg, motion_counter, last_saved, event
\ No newline at end of file
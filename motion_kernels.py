@@ -0,0 +1,56 @@
+"""Optional Numba kernels for the motion pipeline.
+
+numba is not a hard dependency. Without it HAVE_NUMBA is False and the
+kernels stay plain (slow) Python functions, so callers should fall back to
+the equivalent OpenCV calls.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        def wrap(func):
+            return func
+
+        return wrap
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def update_and_threshold(gray, avg, delta, thresh, shift, sensitivity):
+    """
+    Update the uint8 running average and threshold the difference in one pass.
+
+    Fuses the background update, absdiff and binary threshold so the frame is
+    read and written once instead of three times.
+
+    Args:
+        gray: Current blurred grayscale frame (uint8, HxW)
+        avg: Running-average background, updated in place (uint8, HxW)
+        delta: Output for |gray - avg| (uint8, HxW)
+        thresh: Output mask, 255 where delta > sensitivity (uint8, HxW)
+        shift: Background weight as a power of two; avg keeps 1 - 2**-shift
+        sensitivity: Threshold applied to delta
+    """
+    h, w = gray.shape
+    keep = (1 << shift) - 1
+    half = (1 << shift) >> 1
+    for y in prange(h):
+        for x in range(w):
+            g = np.int32(gray[y, x])
+            total = np.int32(avg[y, x]) * keep + g
+            # Round half to even, like cv2.addWeighted's saturate_cast
+            a = total >> shift
+            rem = total - (a << shift)
+            if rem > half or (rem == half and a & 1):
+                a += 1
+            avg[y, x] = a
+            d = g - a if g > a else a - g
+            delta[y, x] = d
+            thresh[y, x] = 255 if d > sensitivity else 0
\ No newline at end of file
@@ -1,11 +1,31 @@
 import os
+import logging
+import threading
+from collections import deque
+import cv2
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from utils import JPEG_PARAMS
+
+logger = logging.getLogger(__name__)
+
+
+def make_session(pool_size=2):
+    """Create a keep-alive HTTP session with a small connection pool."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 
 class TelegramNotifier:
-    def __init__(self, token=None, chat_id=None):
+    def __init__(self, token=None, chat_id=None, session=None):
         self.token = token or os.environ.get("TELEGRAM_TOKEN")
         self.chat_id = chat_id or os.environ.get("TELEGRAM_CHAT_ID")
+        # Persistent session keeps the TLS connection alive between photos
+        self.session = session or make_session()
         if self.token:
             self.api_url = f"https://api.telegram.org/bot{self.token}"
         else:
@@ -14,14 +34,72 @@ class TelegramNotifier:
     def is_configured(self):
         return bool(self.token and self.chat_id)
 
-    def send_photo(self, photo_path, caption=None):
+    def send_photo(self, photo, caption=None):
+        """Send a photo given as a file path, JPEG bytes or a BGR frame (ndarray).
+
+        Frames are encoded in memory, so nothing touches the disk.
+        """
         if not self.is_configured():
             raise RuntimeError("Telegram notifier not configured")
 
         url = f"{self.api_url}/sendPhoto"
-        with open(photo_path, "rb") as f:
-            files = {"photo": f}
-            data = {"chat_id": self.chat_id, "caption": caption or ""}
-            r = requests.post(url, data=data, files=files, timeout=10)
+        data = {"chat_id": self.chat_id, "caption": caption or ""}
+        if isinstance(photo, np.ndarray):
+            ok, buf = cv2.imencode(".jpg", photo, JPEG_PARAMS)
+            if not ok:
+                raise RuntimeError("Failed to encode photo as JPEG")
+            photo = buf.tobytes()
+        if isinstance(photo, (bytes, bytearray)):
+            files = {"photo": ("photo.jpg", photo, "image/jpeg")}
+            r = self.session.post(url, data=data, files=files, timeout=10)
+        else:
+            with open(photo, "rb") as f:
+                files = {"photo": f}
+                r = self.session.post(url, data=data, files=files, timeout=10)
         r.raise_for_status()
-        return r.json()
\ No newline at end of file
+        return r.json()
+
+
+class NotificationDispatcher:
+    """Sends notifications from a background thread so callers never wait on the network.
+
+    Pending notifications sit in a bounded deque; when a burst overflows it the
+    oldest pending notification is dropped rather than delaying newer ones.
+    """
+
+    def __init__(self, maxsize=32):
+        self._pending = deque(maxlen=maxsize)
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._worker, name="notify", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, notifier, photo, caption=None):
+        """Queue a photo (path or JPEG bytes) to be sent by notifier.send_photo."""
+        if len(self._pending) == self._pending.maxlen:
+            logger.warning("Notification queue full; dropping the oldest one")
+        self._pending.append((notifier, photo, caption))
+        self._wake.set()
+
+    def shutdown(self, wait=True, timeout=None):
+        """Stop the dispatcher thread after the queued notifications are sent."""
+        self._stopped = True
+        self._wake.set()
+        if wait:
+            self._thread.join(timeout)
+
+    def _worker(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            while self._pending:
+                try:
+                    notifier, photo, caption = self._pending.popleft()
+                except IndexError:
+                    break
+                try:
+                    notifier.send_photo(photo, caption=caption)
+                except Exception:
+                    logger.exception("Failed to send notification")
+            if self._stopped:
+                break
\ No newline at end of file
@@ -0,0 +1,209 @@
+import numpy as np
+import cv2
+import os
+import sys
+import time
+import weakref
+
+# Ensure project root is on sys.path so tests can import modules
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from frame_producer import FrameProducer
+
+
+class FakeCapture:
+    """Capture that produces frames filled with an increasing value."""
+
+    def __init__(self, shape=(4, 4, 3)):
+        self.shape = shape
+        self.count = 0
+        self.retrieved = 0
+        self.allocations = 0
+        self.buffers = []
+
+    def isOpened(self):
+        return True
+
+    def grab(self):
+        self.count += 1
+        time.sleep(0.001)
+        return True
+
+    def retrieve(self, image=None):
+        if image is None:
+            self.allocations += 1
+            image = np.empty(self.shape, dtype=np.uint8)
+        self.retrieved += 1
+        image[:] = self.count % 256
+        # Weak references only, so the buffers can be freed
+        self.buffers.append(weakref.ref(image))
+        return True, image
+
+    def read(self, image=None):
+        self.grab()
+        return self.retrieve(image)
+
+    def set(self, prop, value):
+        return True
+
+    def release(self):
+        pass
+
+
+def make_producer(monkeypatch, fake, **kwargs):
+    monkeypatch.setattr(cv2, "VideoCapture", lambda idx: fake)
+    monkeypatch.setattr(cv2, "destroyAllWindows", lambda: None)
+    return FrameProducer(camera_index=0, **kwargs)
+
+
+def wait_for_frame(producer, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        frame = producer.get_frame()
+        if frame is not None:
+            return frame
+        time.sleep(0.005)
+    raise AssertionError("No frame captured")
+
+
+def test_get_frame_returns_private_copy(monkeypatch):
+    fake = FakeCapture()
+    producer = make_producer(monkeypatch, fake)
+    producer.start()
+    try:
+        frame = wait_for_frame(producer)
+        assert all(frame is not ref() for ref in fake.buffers)
+    finally:
+        producer.stop()
+
+
+def test_lent_frame_is_not_overwritten(monkeypatch):
+    fake = FakeCapture()
+    producer = make_producer(monkeypatch, fake)
+    producer.start()
+    try:
+        wait_for_frame(producer)
+        frame = producer.get_frame(copy=False)
+        snapshot = frame.copy()
+        start_id = producer.get_frame_id()
+        while producer.get_frame_id() < start_id + 5:
+            time.sleep(0.005)
+        np.testing.assert_array_equal(frame, snapshot)
+    finally:
+        producer.stop()
+
+
+def test_target_fps_skips_decoding(monkeypatch):
+    fake = FakeCapture()
+    producer = make_producer(monkeypatch, fake, target_fps=20)
+    producer.start()
+    try:
+        time.sleep(0.3)
+    finally:
+        producer.stop()
+    assert 0 < fake.retrieved <= 10
+    assert fake.count > fake.retrieved
+
+
+def test_each_frame_is_decoded_into_a_new_buffer(monkeypatch):
+    fake = FakeCapture()
+    producer = make_producer(monkeypatch, fake)
+    producer.start()
+    try:
+        wait_for_frame(producer)
+        # A view is all that is left of the lent frame; it must stay intact
+        view = producer.get_frame(copy=False)[1:]
+        snapshot = view.copy()
+        start_id = producer.get_frame_id()
+        while producer.get_frame_id() < start_id + 20:
+            time.sleep(0.005)
+        np.testing.assert_array_equal(view, snapshot)
+    finally:
+        producer.stop()
+    assert fake.allocations == fake.retrieved
+
+
+def test_request_latest_decodes_on_demand(monkeypatch):
+    fake = FakeCapture()
+    # Low target_fps: without requests only a couple of frames would be decoded
+    producer = make_producer(monkeypatch, fake, target_fps=1)
+    producer.start()
+    try:
+        wait_for_frame(producer)
+        start_id = producer.get_frame_id()
+        for _ in range(5):
+            assert producer.request_latest(timeout=1.0) is not None
+        assert producer.get_frame_id() >= start_id + 5
+    finally:
+        producer.stop()
+
+
+def test_wait_for_frame_returns_each_new_frame(monkeypatch):
+    fake = FakeCapture()
+    producer = make_producer(monkeypatch, fake)
+    producer.start()
+    try:
+        last_id = 0
+        for _ in range(5):
+            frame_id, frame = producer.wait_for_frame(last_id, timeout=1.0)
+            assert frame is not None
+            assert frame_id != last_id
+            last_id = frame_id
+    finally:
+        producer.stop()
+    # A stopped producer returns at once instead of waiting for the timeout
+    last_id = producer.get_frame_id()
+    start = time.monotonic()
+    assert producer.wait_for_frame(last_id, timeout=2.0)[0] == last_id
+    assert time.monotonic() - start < 1.0
+
+
+def test_wait_for_frame_id_matches_frame(monkeypatch):
+    class NumberedCapture(FakeCapture):
+        """Fills the n-th decoded frame with n, which is also its frame id."""
+
+        def retrieve(self, image=None):
+            ret, image = super().retrieve(image)
+            image[:] = self.retrieved % 256
+            return ret, image
+
+    producer = make_producer(monkeypatch, NumberedCapture())
+    producer.start()
+    try:
+        last_id = 0
+        for _ in range(50):
+            frame_id, frame = producer.wait_for_frame(
+                last_id, timeout=1.0, copy=False, request=True
+            )
+            assert frame[0, 0, 0] == frame_id % 256
+            last_id = frame_id
+    finally:
+        producer.stop()
+
+
+def test_wait_for_jpeg_encodes_each_frame_once(monkeypatch):
+    import frame_producer
+
+    encoded = []
+
+    def counting_encode(frame, quality=80, gpu=False):
+        encoded.append(quality)
+        return cv2.imencode(".jpg", frame)[1].tobytes()
+
+    monkeypatch.setattr(frame_producer, "encode_jpeg", counting_encode)
+    fake = FakeCapture()
+    producer = make_producer(monkeypatch, fake, target_fps=1)
+    producer.start()
+    try:
+        frame_id, first = producer.wait_for_jpeg(timeout=1.0)
+        # A second client asking for the same frame gets the shared bytes
+        same_id, second = producer.wait_for_jpeg(frame_id - 1, timeout=1.0)
+        assert same_id == frame_id and second is first
+        assert len(encoded) == 1
+        # Another quality means another encode
+        producer.wait_for_jpeg(frame_id - 1, timeout=1.0, quality=50)
+        assert encoded == [80, 50]
+    finally:
+        producer.stop()
@@ -0,0 +1,125 @@
+import numpy as np
+import os
+import struct
+import sys
+import threading
+
+# Ensure project root is on sys.path so tests can import modules
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from h264_stream import H264Stream, _EncoderRun, read_mp4_boxes
+
+# Stand-in for ffmpeg: writes an init segment, then one moof + mdat per frame
+FAKE_ENCODER = r"""
+import struct, sys
+frame_size = int(sys.argv[1])
+out = sys.stdout.buffer
+def box(kind, payload=b""):
+    out.write(struct.pack(">I4s", 8 + len(payload), kind) + payload)
+box(b"ftyp"); box(b"moov"); out.flush()
+n = 0
+while sys.stdin.buffer.read(frame_size):
+    box(b"moof"); box(b"mdat", struct.pack(">I", n)); out.flush()
+    n += 1
+"""
+
+
+def fake_command(width, height, fps):
+    return [sys.executable, "-c", FAKE_ENCODER, str(width * height * 3)]
+
+
+class CountingProducer:
+    def __init__(self):
+        self.frame_id = 0
+        self.running = True
+        self.cond = threading.Condition()
+
+    def wait_for_frame(self, last_id=0, timeout=1.0, copy=True):
+        with self.cond:
+            self.cond.wait(0.01)
+            self.frame_id += 1
+            return self.frame_id, np.zeros((4, 6, 3), dtype=np.uint8)
+
+    def is_running(self):
+        return self.running
+
+
+def test_read_mp4_boxes_splits_top_level_boxes():
+    import io
+
+    data = (
+        struct.pack(">I4s", 8, b"ftyp")
+        + struct.pack(">I4sQ", 1, b"mdat", 20)
+        + b"abcd"
+        + struct.pack(">I4s", 12, b"moof")
+        + b"xy"  # truncated box is dropped
+    )
+
+    boxes = list(read_mp4_boxes(io.BytesIO(data)))
+
+    assert [kind for kind, _ in boxes] == ["ftyp", "mdat"]
+    assert boxes[1][1].endswith(b"abcd")
+
+
+def test_clients_share_one_encoder_and_start_with_init_segment():
+    stream = H264Stream(CountingProducer(), command=fake_command)
+    first = stream.subscribe()
+    init = next(first)
+    assert init == struct.pack(">I4s", 8, b"ftyp") + struct.pack(">I4s", 8, b"moov")
+    fragment = next(first)
+    assert fragment[4:8] == b"moof" and fragment[12:16] == b"mdat"
+
+    # A second viewer joins the running encoder: same init, later fragments
+    run = stream._run
+    second = stream.subscribe()
+    assert next(second) == init
+    assert next(second)[16:] > fragment[16:]
+    assert stream._run is run and len(run.clients) == 2
+
+    first.close()
+    assert not run.stopped.is_set()
+    second.close()
+    assert run.stopped.is_set()
+
+
+def test_stream_ends_when_producer_stops():
+    producer = CountingProducer()
+    stream = H264Stream(producer, command=fake_command)
+    client = stream.subscribe()
+    next(client)  # init segment
+    next(client)
+    run = stream._run
+
+    producer.running = False
+    # Remaining fragments drain, then the generator finishes
+    drain = threading.Thread(target=lambda: list(client), daemon=True)
+    drain.start()
+    drain.join(timeout=5)
+    assert not drain.is_alive()
+    assert run.stopped.is_set()
+
+
+def test_end_sends_one_sentinel_even_to_full_queues():
+    import queue
+
+    stream = H264Stream(CountingProducer(), client_queue_size=2)
+    run = _EncoderRun()
+    client = queue.Queue(maxsize=2)
+    client.put(b"a")
+    client.put(b"b")
+    run.clients.add(client)
+
+    enders = [threading.Thread(target=stream._end, args=(run,)) for _ in range(4)]
+    for t in enders:
+        t.start()
+    for t in enders:
+        t.join()
+    stream._broadcast(run, b"late")
+
+    items = []
+    while not client.empty():
+        items.append(client.get_nowait())
+    assert items[-1] is None and items.count(None) == 1
+    assert b"late" not in items and run.stopped.is_set()
@@ -0,0 +1,355 @@
+import numpy as np
+import cv2
+import os
+import sys
+import threading
+
+# Ensure project root is on sys.path so tests can import modules
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from image_analyzer import ImageAnalyzer, AsyncImageAnalyzer
+
+CLASSES_PATH = os.path.join(ROOT, "yolo_files", "coco.names")
+CAT_ID = 15
+DOG_ID = 16
+
+
+def make_row(cx, cy, w, h, class_id, confidence, num_classes=80):
+    """Build a single YOLO output row (normalized box + class scores)."""
+    row = np.zeros(5 + num_classes, dtype=np.float32)
+    row[:4] = [cx, cy, w, h]
+    row[4] = confidence
+    row[5 + class_id] = confidence
+    return row
+
+
+class FakeNet:
+    """Stand-in for cv2.dnn_Net that returns canned YOLO output rows."""
+
+    def __init__(self, rows):
+        self.rows = np.array(rows, dtype=np.float32)
+        self.batch = 1
+        self.forward_calls = 0
+        self.unavailable = set()
+        # Backends accepted by setPreferableBackend that fail at forward()
+        self.broken = set()
+
+    def getUnconnectedOutLayersNames(self):
+        return ("yolo_out",)
+
+    def setPreferableBackend(self, backend):
+        if backend in self.unavailable:
+            raise cv2.error("Backend (plugin) is not available")
+        self.backend = backend
+
+    def setPreferableTarget(self, target):
+        self.target = target
+
+    def setInput(self, blob):
+        self.batch = blob.shape[0]
+
+    def forward(self, names):
+        if getattr(self, "backend", None) in self.broken:
+            raise cv2.error("Backend failed to initialize")
+        self.forward_calls += 1
+        return [np.concatenate([self.rows] * self.batch, axis=0)]
+
+
+def make_analyzer(monkeypatch, rows, **kwargs):
+    net = FakeNet(rows)
+    monkeypatch.setattr(cv2.dnn, "readNet", lambda model, config: net)
+    monkeypatch.setattr(ImageAnalyzer, "_NET_CACHE", {})
+    kwargs.setdefault("target_objects", "cat")
+    kwargs.setdefault("backend", "cpu")
+    analyzer = ImageAnalyzer(classes_path=CLASSES_PATH, **kwargs)
+    # Ignore the warmup pass done by the constructor
+    net.forward_calls = 0
+    return analyzer, net
+
+
+def make_image(shape=(100, 200, 3)):
+    return np.zeros(shape, dtype=np.uint8)
+
+
+def test_detect_objects_filters_targets_and_scales_boxes(monkeypatch):
+    rows = [
+        make_row(0.5, 0.5, 0.2, 0.4, CAT_ID, 0.9),
+        make_row(0.25, 0.25, 0.1, 0.1, DOG_ID, 0.9),  # not a target
+        make_row(0.8, 0.8, 0.1, 0.1, CAT_ID, 0.3),  # below threshold
+    ]
+    analyzer, _ = make_analyzer(monkeypatch, rows)
+
+    results = analyzer.detect_objects(make_image())
+
+    assert len(results) == 1
+    assert results[0]["label"] == "cat"
+    assert results[0]["confidence"] == np.float32(0.9)
+    assert results[0]["box"] == [80, 30, 40, 40]
+
+
+def test_detect_objects_applies_nms(monkeypatch):
+    rows = [
+        make_row(0.5, 0.5, 0.2, 0.4, CAT_ID, 0.9),
+        make_row(0.51, 0.5, 0.2, 0.4, CAT_ID, 0.8),  # overlaps the first box
+    ]
+    analyzer, _ = make_analyzer(monkeypatch, rows)
+
+    results = analyzer.detect_objects(make_image())
+
+    assert len(results) == 1
+    assert results[0]["confidence"] == np.float32(0.9)
+
+
+def test_detect_objects_batch_splits_results_per_image(monkeypatch):
+    rows = [make_row(0.5, 0.5, 0.2, 0.4, CAT_ID, 0.9)]
+    analyzer, net = make_analyzer(monkeypatch, rows)
+
+    results = analyzer.detect_objects_batch(
+        [make_image(), None, make_image((200, 400, 3))]
+    )
+
+    assert net.forward_calls == 1
+    assert len(results) == 3
+    assert results[0][0]["box"] == [80, 30, 40, 40]
+    assert results[1] == []
+    assert results[2][0]["box"] == [160, 60, 80, 80]
+
+
+def test_detect_objects_reuses_empty_verdict_for_unchanged_scene(monkeypatch):
+    rows = [make_row(0.5, 0.5, 0.2, 0.4, DOG_ID, 0.9)]  # not a target
+    analyzer, net = make_analyzer(monkeypatch, rows)
+
+    assert analyzer.detect_objects(make_image()) == []
+    assert analyzer.detect_objects(make_image()) == []
+    assert net.forward_calls == 1
+
+    changed = make_image()
+    changed[:, :100] = 255
+    analyzer.detect_objects(changed)
+    assert net.forward_calls == 2
+
+
+def test_detect_objects_never_reuses_boxes(monkeypatch):
+    rows = [make_row(0.5, 0.5, 0.2, 0.4, CAT_ID, 0.9)]
+    analyzer, net = make_analyzer(monkeypatch, rows)
+
+    analyzer.detect_objects(make_image())
+    analyzer.detect_objects(make_image())
+    assert net.forward_calls == 2
+
+
+def test_detect_objects_cache_misses_small_new_object(monkeypatch):
+    rows = [make_row(0.5, 0.5, 0.2, 0.4, DOG_ID, 0.9)]  # not a target
+    analyzer, net = make_analyzer(monkeypatch, rows)
+
+    analyzer.detect_objects(make_image())
+    # Barely changes the mean of the whole thumbnail, but not of its cell
+    small = make_image()
+    small[10:15, 10:15] = 255
+    analyzer.detect_objects(small)
+    assert net.forward_calls == 2
+
+
+def test_detect_objects_cache_can_be_disabled(monkeypatch):
+    rows = [make_row(0.5, 0.5, 0.2, 0.4, DOG_ID, 0.9)]  # not a target
+    analyzer, net = make_analyzer(monkeypatch, rows, cache_threshold=0)
+
+    analyzer.detect_objects(make_image())
+    analyzer.detect_objects(make_image())
+    assert net.forward_calls == 2
+
+
+def test_detect_objects_nms_is_class_aware(monkeypatch):
+    rows = [
+        make_row(0.5, 0.5, 0.2, 0.4, CAT_ID, 0.9),
+        make_row(0.5, 0.5, 0.2, 0.4, DOG_ID, 0.8),  # same box, other class
+    ]
+    analyzer, _ = make_analyzer(monkeypatch, rows, target_objects="cat,dog")
+
+    results = analyzer.detect_objects(make_image())
+
+    assert sorted(r["label"] for r in results) == ["cat", "dog"]
+
+
+def test_async_analyzer_runs_callback_and_drops_oldest_pending(monkeypatch):
+    rows = [make_row(0.5, 0.5, 0.2, 0.4, CAT_ID, 0.9)]
+    analyzer, _ = make_analyzer(monkeypatch, rows)
+    async_analyzer = AsyncImageAnalyzer(analyzer)
+    started = threading.Event()
+    release = threading.Event()
+    received = []
+
+    def callback(detections):
+        started.set()
+        release.wait(2)
+        received.append(detections)
+
+    try:
+        first = async_analyzer.submit(make_image(), callback=callback)
+        assert started.wait(2)
+        assert async_analyzer.busy()
+        assert async_analyzer.busy_event.is_set()
+        stale = async_analyzer.submit(make_image())
+        latest = async_analyzer.submit(make_image())
+
+        release.set()
+        assert first.result(timeout=2)[0]["label"] == "cat"
+        assert received[0][0]["label"] == "cat"
+        assert stale.cancelled()
+        assert latest.result(timeout=2)[0]["label"] == "cat"
+    finally:
+        async_analyzer.shutdown()
+    assert not async_analyzer.busy()
+
+
+def test_async_analyzer_batches_waiting_frames(monkeypatch):
+    rows = [make_row(0.5, 0.5, 0.2, 0.4, CAT_ID, 0.9)]
+    analyzer, net = make_analyzer(monkeypatch, rows)
+    async_analyzer = AsyncImageAnalyzer(analyzer, max_pending=3, batch_size=3)
+    started = threading.Event()
+    release = threading.Event()
+
+    def block(detections):
+        started.set()
+        release.wait(2)
+
+    try:
+        first = async_analyzer.submit(make_image(), callback=block)
+        assert started.wait(2)
+        waiting = [async_analyzer.submit(make_image((200, 400, 3))) for _ in range(3)]
+
+        release.set()
+        first.result(timeout=2)
+        for future in waiting:
+            assert future.result(timeout=2)[0]["box"] == [160, 60, 80, 80]
+    finally:
+        async_analyzer.shutdown()
+    # One pass for the first frame, one batched pass for the waiting frames
+    assert net.forward_calls == 2
+
+
+def test_precision_selects_half_precision_target(monkeypatch):
+    _, net = make_analyzer(monkeypatch, [], backend="cpu", precision="fp32")
+    assert net.target == cv2.dnn.DNN_TARGET_CPU
+
+    _, net = make_analyzer(monkeypatch, [], backend="cpu", precision="fp16")
+    assert net.target == cv2.dnn.DNN_TARGET_CPU_FP16
+
+
+def test_openvino_backend_falls_back_to_cpu(monkeypatch):
+    analyzer, net = make_analyzer(monkeypatch, [], backend="openvino")
+    assert analyzer.backend == "openvino"
+    assert net.backend == cv2.dnn.DNN_BACKEND_INFERENCE_ENGINE
+
+    net.unavailable.add(cv2.dnn.DNN_BACKEND_INFERENCE_ENGINE)
+    assert analyzer._configure_backend("openvino") == "cpu"
+    assert net.backend == cv2.dnn.DNN_BACKEND_OPENCV
+
+
+def test_backend_failing_at_forward_falls_back_to_cpu(monkeypatch):
+    net = FakeNet([])
+    net.broken.add(cv2.dnn.DNN_BACKEND_CUDA)
+    monkeypatch.setattr(cv2.dnn, "readNet", lambda model, config: net)
+    monkeypatch.setattr(cv2.cuda, "getCudaEnabledDeviceCount", lambda: 1)
+    monkeypatch.setattr(ImageAnalyzer, "_NET_CACHE", {})
+
+    analyzer = ImageAnalyzer(classes_path=CLASSES_PATH, backend="cuda")
+    assert analyzer.backend == "cpu"
+    assert net.backend == cv2.dnn.DNN_BACKEND_OPENCV
+    assert net.forward_calls == 1  # the CPU warmup
+
+    # Cached under the backend that actually works
+    assert ImageAnalyzer(classes_path=CLASSES_PATH, backend="cpu").net is net
+
+
+def test_auto_backend_never_picks_opencl(monkeypatch):
+    toggled = []
+    monkeypatch.setattr(cv2.ocl, "haveOpenCL", lambda: True)
+    monkeypatch.setattr(cv2.ocl, "setUseOpenCL", toggled.append)
+    monkeypatch.setattr(cv2.cuda, "getCudaEnabledDeviceCount", lambda: 0)
+
+    analyzer, net = make_analyzer(monkeypatch, [], backend="auto")
+    assert analyzer.backend == "cpu"
+    assert net.target == cv2.dnn.DNN_TARGET_CPU
+
+    analyzer, net = make_analyzer(monkeypatch, [], backend="opencl")
+    assert analyzer.backend == "opencl"
+    assert net.target == cv2.dnn.DNN_TARGET_OPENCL
+    assert toggled == []
+
+
+def test_analyzers_share_cached_net(monkeypatch):
+    loads = []
+
+    def fake_read_net(model, config):
+        loads.append(model)
+        return FakeNet([])
+
+    monkeypatch.setattr(cv2.dnn, "readNet", fake_read_net)
+    monkeypatch.setattr(ImageAnalyzer, "_NET_CACHE", {})
+
+    first = ImageAnalyzer(classes_path=CLASSES_PATH, backend="cpu")
+    second = ImageAnalyzer(classes_path=CLASSES_PATH, backend="cpu")
+
+    assert len(loads) == 1
+    assert first.net is second.net
+
+
+def test_show_and_save_writes_encoded_jpeg(monkeypatch, tmp_path):
+    rows = [make_row(0.5, 0.5, 0.2, 0.4, CAT_ID, 0.9)]
+    analyzer, _ = make_analyzer(monkeypatch, rows)
+
+    success, save_path, num_objects, jpeg_bytes = (
+        analyzer.show_and_save_identified_image(
+            make_image(),
+            notification_dir=str(tmp_path),
+            show_image=False,
+            return_jpeg=True,
+        )
+    )
+
+    assert success and num_objects == 1
+    with open(save_path, "rb") as f:
+        assert f.read() == jpeg_bytes
+    assert jpeg_bytes[:2] == b"\xff\xd8"
+
+
+def test_make_blob_fallback_matches_blob_from_image(monkeypatch):
+    analyzer, _ = make_analyzer(monkeypatch, [])
+    analyzer._blob_params = None
+    img = np.random.default_rng(0).integers(0, 255, (120, 160, 3), dtype=np.uint8)
+
+    expected = cv2.dnn.blobFromImage(
+        img, 1 / 255.0, (416, 416), swapRB=True, crop=False
+    )
+    np.testing.assert_allclose(analyzer._make_blob(img), expected, atol=1e-6)
+
+
+def test_detect_stream_yields_results_in_order(monkeypatch):
+    rows = [make_row(0.5, 0.5, 0.2, 0.4, CAT_ID, 0.9)]
+    analyzer, net = make_analyzer(monkeypatch, rows)
+    frames = [make_image(), make_image((200, 400, 3)), make_image()]
+
+    results = list(analyzer.detect_stream(frames))
+
+    assert net.forward_calls == 3
+    assert all(out is frame for (out, _), frame in zip(results, frames))
+    assert results[1][1][0]["box"] == [160, 60, 80, 80]
+
+
+def test_show_and_save_reuses_given_results(monkeypatch, tmp_path):
+    rows = [make_row(0.5, 0.5, 0.2, 0.4, CAT_ID, 0.9)]
+    analyzer, net = make_analyzer(monkeypatch, rows)
+    detections = analyzer.detect_objects(make_image())
+
+    success, _, num_objects = analyzer.show_and_save_identified_image(
+        make_image(),
+        notification_dir=str(tmp_path),
+        show_image=False,
+        results=detections,
+    )
+
+    assert success and num_objects == 1
+    assert net.forward_calls == 1
@@ -1,5 +1,6 @@
 import numpy as np
 import cv2
+import threading
 import types
 import os
 import sys
@@ -77,3 +78,284 @@ def test_motion_detector_saves_frames(monkeypatch, tmp_path):
     assert len(saved) == len(events)
     for p in saved:
         assert os.path.basename(p).startswith("motion_")
+    # Events report the largest moving region for downstream gating
+    for event in events:
+        assert event["area"] >= 50
+        assert event["frame_delta_mean"] > 0
+
+
+def test_motion_detector_downscales_large_frames(monkeypatch):
+    static = make_frame((480, 640, 3))
+    motion = static.copy()
+    cv2.rectangle(motion, (100, 100), (300, 300), (255, 255, 255), -1)
+    frames = [static.copy()] + [motion.copy() for _ in range(2)]
+    monkeypatch.setattr(cv2, "VideoCapture", lambda idx: FakeCapture(frames))
+
+    resized = []
+    real_resize = cv2.resize
+
+    def tracking_resize(src, dsize, *args, **kwargs):
+        resized.append(dsize)
+        return real_resize(src, dsize, *args, **kwargs)
+
+    monkeypatch.setattr(cv2, "resize", tracking_resize)
+
+    detector = MotionDetector(
+        sensitivity=10,
+        min_area=500,
+        camera_index=0,
+        min_motion_frames=1,
+        cooldown_seconds=0,
+        save_frames=False,
+        work_width=160,
+    )
+    events = list(detector.run())
+
+    assert resized and set(resized) == {(160, 120)}
+    assert len(events) >= 1
+    # Area is reported in full-resolution pixels, full-size frame is kept
+    assert events[0]["area"] > 200 * 200 * 0.5
+    assert events[0]["frame"].shape == (480, 640, 3)
+
+
+def test_motion_detector_umat_path_matches_cpu(monkeypatch):
+    static = make_frame()
+    motion = static.copy()
+    cv2.rectangle(motion, (10, 10), (30, 30), (255, 255, 255), -1)
+    frames = [static.copy()] + [motion.copy() for _ in range(2)]
+    # UMat falls back to CPU kernels when no OpenCL device is present
+    monkeypatch.setattr(cv2.ocl, "haveOpenCL", lambda: True)
+
+    areas = []
+    for use_gpu in (False, True):
+        monkeypatch.setattr(cv2, "VideoCapture", lambda idx: FakeCapture(frames))
+        detector = MotionDetector(
+            sensitivity=10,
+            min_area=50,
+            camera_index=0,
+            min_motion_frames=1,
+            cooldown_seconds=0,
+            save_frames=False,
+            use_gpu=use_gpu,
+        )
+        assert detector.use_gpu == use_gpu
+        areas.append([event["area"] for event in detector.run()])
+
+    assert areas[0] and areas[0] == areas[1]
+
+
+def test_motion_detector_average_background_model(monkeypatch):
+    static = make_frame()
+    motion = static.copy()
+    cv2.rectangle(motion, (10, 10), (30, 30), (255, 255, 255), -1)
+    frames = [static.copy() for _ in range(3)] + [motion.copy() for _ in range(2)]
+    monkeypatch.setattr(cv2, "VideoCapture", lambda idx: FakeCapture(frames))
+
+    detector = MotionDetector(
+        sensitivity=10,
+        min_area=50,
+        camera_index=0,
+        min_motion_frames=1,
+        cooldown_seconds=0,
+        save_frames=False,
+        background_model="average",
+    )
+
+    assert detector.bg_subtractor is None
+    assert len(list(detector.run())) >= 1
+
+
+def test_motion_detector_skips_stale_producer_frames(monkeypatch):
+    class StoppedProducer:
+        """Producer that keeps returning its last frame, as after stop()."""
+
+        def __init__(self):
+            self.requests = 0
+            self.frame = make_frame()
+
+        def wait_for_frame(self, last_id=0, timeout=1.0, copy=True, request=False):
+            self.requests += 1
+            if self.requests >= 5:
+                detector.running = False
+            return 1, self.frame
+
+        def is_running(self):
+            return False
+
+    producer = StoppedProducer()
+    detector = MotionDetector(frame_producer=producer, save_frames=False)
+    processed = []
+
+    def fake_process(frame, avg, motion_counter, last_saved):
+        processed.append(frame)
+        return avg, motion_counter, last_saved, None
+
+    monkeypatch.setattr(detector, "_process_frame", fake_process)
+
+    assert list(detector.run()) == []
+    assert producer.requests == 5
+    assert len(processed) == 1
+
+
+def test_motion_detector_thins_frames_while_analysis_busy(monkeypatch):
+    class CountingProducer:
+        def __init__(self):
+            self.frame_id = 0
+
+        def wait_for_frame(self, last_id=0, timeout=1.0, copy=True, request=False):
+            self.frame_id += 1
+            if self.frame_id > 12:
+                detector.running = False
+            return self.frame_id, make_frame()
+
+        def is_running(self):
+            return True
+
+    busy = threading.Event()
+    busy.set()
+    detector = MotionDetector(
+        frame_producer=CountingProducer(),
+        save_frames=False,
+        analysis_busy=busy,
+        busy_frame_stride=3,
+    )
+    processed = []
+
+    def fake_process(frame, avg, motion_counter, last_saved):
+        processed.append(frame)
+        return avg, motion_counter, last_saved, None
+
+    monkeypatch.setattr(detector, "_process_frame", fake_process)
+    list(detector.run())
+
+    assert len(processed) == 4
+
+
+def test_fused_kernel_matches_opencv_path(monkeypatch):
+    static = make_frame((40, 40, 3))
+    motion = static.copy()
+    cv2.rectangle(motion, (5, 5), (20, 20), (255, 255, 255), -1)
+    frames = [static.copy()] + [motion.copy() for _ in range(2)]
+
+    areas = []
+    for fused in (False, True):
+        monkeypatch.setattr(cv2, "VideoCapture", lambda idx: FakeCapture(frames))
+        detector = MotionDetector(
+            sensitivity=10,
+            min_area=20,
+            camera_index=0,
+            min_motion_frames=1,
+            cooldown_seconds=0,
+            save_frames=False,
+            background_model="average",
+        )
+        # Without numba the kernel runs as plain Python, which is fine here
+        detector.fused_kernel = fused
+        areas.append([event["area"] for event in detector.run()])
+
+    assert areas[0] and areas[0] == areas[1]
+
+
+def test_fused_kernel_rounds_like_add_weighted():
+    from motion_kernels import update_and_threshold
+
+    rng = np.random.default_rng(0)
+    gray = rng.integers(0, 256, (32, 32), dtype=np.uint8)
+    background = rng.integers(0, 256, (32, 32), dtype=np.uint8)
+    for shift in (1, 2, 3):
+        weight = 2.0**-shift
+        expected = cv2.addWeighted(background, 1 - weight, gray, weight, 0)
+        avg = background.copy()
+        delta = np.empty_like(avg)
+        thresh = np.empty_like(avg)
+        update_and_threshold(gray, avg, delta, thresh, shift, 10)
+        np.testing.assert_array_equal(avg, expected)
+        np.testing.assert_array_equal(delta, cv2.absdiff(gray, expected))
+
+
+def test_motion_detector_uses_cuda_pipeline_when_available(monkeypatch):
+    class FakeCudaPipeline:
+        def __init__(self, blur_ksize, sensitivity, use_mog2):
+            self.frames = 0
+
+        def apply(self, frame):
+            self.frames += 1
+            mask = np.zeros(frame.shape[:2], dtype=np.uint8)
+            if self.frames == 1:
+                return None, None
+            mask[10:30, 10:30] = 255
+            return mask, mask
+
+    monkeypatch.setattr(motion_detector, "_cuda_available", lambda: True)
+    monkeypatch.setattr(motion_detector, "_CudaMotionPipeline", FakeCudaPipeline)
+    frames = [make_frame() for _ in range(3)]
+    monkeypatch.setattr(cv2, "VideoCapture", lambda idx: FakeCapture(frames))
+
+    detector = MotionDetector(
+        min_area=50,
+        camera_index=0,
+        min_motion_frames=1,
+        cooldown_seconds=0,
+        save_frames=False,
+        use_gpu=True,
+    )
+    events = list(detector.run())
+
+    assert detector._cuda.frames == 3 and not detector.use_gpu
+    assert len(events) == 2 and events[0]["area"] == 400
+
+
+def test_motion_detector_hysteresis_fires_once_per_activity(monkeypatch):
+    static = make_frame()
+    motion = static.copy()
+    cv2.rectangle(motion, (10, 10), (40, 40), (255, 255, 255), -1)
+    # Flicker keeps the scene active without the EMA dropping below lo_thresh
+    active = [motion.copy() if i % 2 else static.copy() for i in range(20)]
+    frames = [static.copy()] + active + [static.copy() for _ in range(40)] + active
+    monkeypatch.setattr(cv2, "VideoCapture", lambda idx: FakeCapture(frames))
+
+    detector = MotionDetector(
+        sensitivity=10,
+        min_area=50,
+        camera_index=0,
+        min_motion_frames=1,
+        cooldown_seconds=0,
+        save_frames=False,
+        background_model="average",
+        hi_thresh=200,
+        lo_thresh=50,
+    )
+
+    # One event per burst of activity instead of one per motion frame
+    assert len(list(detector.run())) == 2
+
+
+def test_motion_detector_weak_motion_does_not_disarm_gate(monkeypatch):
+    static = make_frame()
+    weak = static.copy()
+    cv2.rectangle(weak, (10, 10), (25, 25), (255, 255, 255), -1)
+    strong = static.copy()
+    cv2.rectangle(strong, (10, 10), (60, 60), (255, 255, 255), -1)
+    # The weak flicker alone keeps the EMA above hi_thresh; the strong burst
+    # right after it belongs to the same activity
+    weak_burst = [weak.copy() if i % 2 else static.copy() for i in range(20)]
+    strong_burst = [strong.copy() if i % 2 else static.copy() for i in range(6)]
+    frames = [static.copy()] + weak_burst + strong_burst
+    monkeypatch.setattr(cv2, "VideoCapture", lambda idx: FakeCapture(frames))
+
+    detector = MotionDetector(
+        sensitivity=10,
+        min_area=50,
+        camera_index=0,
+        min_motion_frames=1,
+        cooldown_seconds=60,
+        save_frames=False,
+        background_model="average",
+        hi_thresh=100,
+        lo_thresh=20,
+        min_analyze_area=1000,
+    )
+
+    events = list(detector.run())
+    assert len(events) == 1
+    assert events[0]["area"] >= 1000
@@ -0,0 +1,74 @@
+import numpy as np
+import os
+import sys
+import threading
+
+# Ensure project root is on sys.path so tests can import modules
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from notifications import NotificationDispatcher, TelegramNotifier
+
+
+class FakeNotifier:
+    def __init__(self, block=None):
+        self.sent = []
+        self.block = block
+        self.started = threading.Event()
+
+    def send_photo(self, photo, caption=None):
+        self.started.set()
+        if self.block is not None:
+            self.block.wait(2)
+        if photo == b"boom":
+            raise RuntimeError("network down")
+        self.sent.append((photo, caption))
+
+
+def test_dispatcher_sends_in_background_and_survives_errors():
+    notifier = FakeNotifier()
+    dispatcher = NotificationDispatcher()
+
+    dispatcher.enqueue(notifier, b"boom", "first")
+    dispatcher.enqueue(notifier, b"jpeg", "second")
+    dispatcher.shutdown(timeout=2)
+
+    assert notifier.sent == [(b"jpeg", "second")]
+
+
+def test_dispatcher_drops_oldest_when_full():
+    release = threading.Event()
+    notifier = FakeNotifier(block=release)
+    dispatcher = NotificationDispatcher(maxsize=2)
+
+    dispatcher.enqueue(notifier, b"0", "in flight")
+    assert notifier.started.wait(2)
+    for i in range(1, 4):
+        dispatcher.enqueue(notifier, str(i).encode(), "queued")
+
+    release.set()
+    dispatcher.shutdown(timeout=2)
+
+    assert [photo for photo, _ in notifier.sent] == [b"0", b"2", b"3"]
+
+
+def test_telegram_send_photo_encodes_frames_in_memory():
+    class FakeResponse:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"ok": True}
+
+    class FakeSession:
+        def post(self, url, data=None, files=None, timeout=None):
+            self.files = files
+            return FakeResponse()
+
+    session = FakeSession()
+    notifier = TelegramNotifier(token="t", chat_id="c", session=session)
+
+    assert notifier.send_photo(np.zeros((8, 8, 3), dtype=np.uint8), "cat")["ok"]
+    name, payload, mime = session.files["photo"]
+    assert mime == "image/jpeg" and payload[:2] == b"\xff\xd8"
@@ -0,0 +1,39 @@
+import numpy as np
+import cv2
+import os
+import sys
+
+# Ensure project root is on sys.path so tests can import modules
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import utils
+
+
+class FakeNvJpeg:
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, img, quality):
+        self.calls += 1
+        return b"\xff\xd8gpu"
+
+
+def test_encode_jpeg_round_trips():
+    frame = np.full((48, 64, 3), 127, dtype=np.uint8)
+    decoded = cv2.imdecode(np.frombuffer(utils.encode_jpeg(frame), np.uint8), 1)
+    assert decoded.shape == frame.shape
+
+
+def test_encode_jpeg_uses_gpu_only_for_large_frames(monkeypatch):
+    fake = FakeNvJpeg()
+    monkeypatch.setattr(utils, "_NVJPEG", fake)
+    small = np.zeros((480, 640, 3), dtype=np.uint8)
+    large = np.zeros((1080, 1920, 3), dtype=np.uint8)
+
+    assert utils.encode_jpeg(small, gpu=True)[:2] == b"\xff\xd8"
+    assert fake.calls == 0
+    assert utils.encode_jpeg(large) != b"\xff\xd8gpu"
+    assert utils.encode_jpeg(large, gpu=True) == b"\xff\xd8gpu"
+    assert fake.calls == 1
@@ -0,0 +1,345 @@
+import numpy as np
+import cv2
+import os
+import sys
+import threading
+import time
+
+# Ensure project root is on sys.path so tests can import modules
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import web_server
+
+
+def test_motion_event_image_is_served_from_memory(monkeypatch, tmp_path):
+    emitted = []
+    tasks = []
+    monkeypatch.setattr(web_server.socketio, "emit", lambda *a: emitted.append(a))
+    monkeypatch.setattr(
+        web_server.socketio,
+        "start_background_task",
+        lambda target, *args: tasks.append((target, args)),
+    )
+    monkeypatch.setattr(
+        web_server, "recent_events", web_server.deque(maxlen=web_server.MAX_EVENTS)
+    )
+    monkeypatch.setattr(web_server, "_recent_images", web_server.OrderedDict())
+    monkeypatch.setitem(web_server.CONFIG, "FRAME_DIR", str(tmp_path))
+
+    web_event = {
+        "timestamp": "2024-01-01T00:00:00",
+        "frame_path": str(tmp_path / "cat.jpg"),
+        "image_url": "/frames/cat.jpg",
+    }
+    web_server.emit_motion_event(web_event, jpeg=b"\xff\xd8cached")
+
+    # The broadcast is handed off rather than done on the calling thread
+    assert not emitted
+    for target, args in tasks:
+        target(*args)
+    # The caller's dict is stored and broadcast without being rebuilt
+    assert emitted[0][1] is web_event
+    assert web_server.recent_events[0] is web_event
+    # Not on disk: the response must come from the in-memory copy
+    response = web_server.app.test_client().get("/frames/cat.jpg")
+    assert response.status_code == 200
+    assert response.data == b"\xff\xd8cached"
+    assert response.mimetype == "image/jpeg"
+    assert response.cache_control.immutable
+
+
+def test_frames_on_disk_are_served_with_caching_headers(monkeypatch, tmp_path):
+    monkeypatch.setattr(web_server, "_recent_images", web_server.OrderedDict())
+    monkeypatch.setitem(web_server.CONFIG, "FRAME_DIR", str(tmp_path))
+    (tmp_path / "old.jpg").write_bytes(b"\xff\xd8disk")
+    client = web_server.app.test_client()
+
+    response = client.get("/frames/old.jpg")
+    assert response.data == b"\xff\xd8disk"
+    assert response.cache_control.max_age == web_server.FRAME_MAX_AGE
+    assert response.cache_control.public and response.cache_control.immutable
+    response.close()
+
+    revalidated = client.get(
+        "/frames/old.jpg", headers={"If-None-Match": response.headers["ETag"]}
+    )
+    assert revalidated.status_code == 304
+
+
+class StaticProducer:
+    """Producer stand-in that publishes a new frame on every call."""
+
+    def __init__(self):
+        self.frame_id = 0
+        self.skipped = 0
+        self.qualities = []
+
+    def wait_for_frame(self, last_id=0, timeout=1.0, copy=True):
+        self.frame_id += 1
+        self.skipped += 1
+        return self.frame_id, None
+
+    def wait_for_jpeg(self, last_id=0, timeout=1.0, quality=80):
+        self.frame_id += 1
+        self.qualities.append(quality)
+        frame = np.full((48, 64, 3), 127, dtype=np.uint8)
+        return self.frame_id, cv2.imencode(".jpg", frame)[1].tobytes()
+
+    def is_running(self):
+        return True
+
+
+def open_video_feed(producer):
+    web_server.app.config["FRAME_PRODUCER"] = producer
+    try:
+        return web_server.app.test_client().get("/video_feed")
+    finally:
+        web_server.app.config.pop("FRAME_PRODUCER")
+
+
+def test_video_feed_streams_jpeg_frames():
+    response = open_video_feed(StaticProducer())
+    chunk = next(response.response)
+    response.close()
+
+    header = b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"
+    assert chunk.startswith(header)
+    frame = cv2.imdecode(np.frombuffer(chunk[len(header) :], np.uint8), 1)
+    assert frame.shape == (48, 64, 3)
+
+
+def test_video_feed_backs_off_for_slow_clients(monkeypatch):
+    monkeypatch.setitem(web_server.CONFIG, "JPEG_QUALITY", 80)
+    producer = StaticProducer()
+    response = open_video_feed(producer)
+    frames = response.response
+
+    next(frames)
+    time.sleep(0.5)  # slow client: the frame took 500 ms to write
+    next(frames)
+    assert producer.skipped == 1
+    assert producer.qualities == [80, 75]
+
+    # A fast client recovers the configured quality and stops dropping frames
+    for _ in range(4):
+        next(frames)
+    response.close()
+    assert producer.skipped == 1
+    assert producer.qualities[-1] == 80
+
+
+def test_video_feed_follows_jpeg_quality_changes(monkeypatch):
+    monkeypatch.setitem(web_server.CONFIG, "JPEG_QUALITY", 80)
+    producer = StaticProducer()
+    response = open_video_feed(producer)
+    frames = response.response
+
+    next(frames)
+    # Lowered while the stream is open: the next frame already uses it
+    monkeypatch.setitem(web_server.CONFIG, "JPEG_QUALITY", 60)
+    next(frames)
+    response.close()
+    assert producer.qualities == [80, 60]
+
+
+def test_recent_events_keep_newest_first(monkeypatch):
+    monkeypatch.setattr(web_server, "recent_events", web_server.deque(maxlen=3))
+    monkeypatch.setattr(web_server, "_events_json", None)
+    for i in range(5):
+        web_server.add_event({"timestamp": i})
+
+    client = web_server.app.test_client()
+    response = client.get("/api/events")
+    assert [e["timestamp"] for e in response.get_json()["events"]] == [4, 3, 2]
+
+    # The payload is serialized once and rebuilt only after a new event
+    cached = web_server._events_json
+    assert client.get("/api/events").data == cached.encode()
+    assert web_server._events_json is cached
+    web_server.add_event({"timestamp": 5})
+    response = client.get("/api/events")
+    assert [e["timestamp"] for e in response.get_json()["events"]] == [5, 4, 3]
+
+
+def test_settings_page_is_static_and_classes_are_cached(monkeypatch, tmp_path):
+    classes_path = tmp_path / "classes.names"
+    classes_path.write_text("cat\ndog\n")
+    monkeypatch.setitem(web_server.CONFIG, "ANALYZER_CLASSES_PATH", str(classes_path))
+    web_server._load_coco_classes.cache_clear()
+    client = web_server.app.test_client()
+
+    page = client.get("/settings")
+    assert b"/api/coco_classes" in page.data and b"{{" not in page.data
+    assert page.cache_control.max_age == web_server.SETTINGS_PAGE_MAX_AGE
+    page.close()
+
+    assert client.get("/api/coco_classes").get_json() == {"classes": ["cat", "dog"]}
+    classes_path.write_text("cat\n")
+    assert client.get("/api/coco_classes").get_json() == {"classes": ["cat", "dog"]}
+    assert web_server._load_coco_classes.cache_info().hits == 1
+
+
+def test_update_config_validates_and_reports_changes(monkeypatch):
+    saved = []
+    monkeypatch.setattr(web_server, "save_config", lambda c: saved.append(c) or True)
+    monkeypatch.setattr(web_server.socketio, "emit", lambda *a: None)
+    for key, value in (("SENSITIVITY", 25), ("CAMERA_INDEX", 0), ("DEBUG", False)):
+        monkeypatch.setitem(web_server.CONFIG, key, value)
+    client = web_server.app.test_client()
+
+    result = client.post(
+        "/api/config",
+        json={
+            "SENSITIVITY": "30",
+            "CAMERA_INDEX": "0",
+            "DEBUG": "true",
+            "NOT_A_SETTING": "x",  # unknown, ignored
+        },
+    ).get_json()
+
+    assert result["success"] and result["changed"]
+    assert "restart the application" in result["message"]
+    assert "Camera restarted" not in result["message"]
+    assert web_server.CONFIG["SENSITIVITY"] == 30
+    assert web_server.CONFIG["CAMERA_INDEX"] == 0
+    assert web_server.CONFIG["DEBUG"] is True
+    assert "NOT_A_SETTING" not in web_server.CONFIG
+    assert len(saved) == 1
+
+    unchanged = client.post("/api/config", json={"SENSITIVITY": 30}).get_json()
+    assert not unchanged["changed"] and len(saved) == 1
+
+    # One invalid value rejects the whole update
+    response = client.post("/api/config", json={"SENSITIVITY": 40, "CAMERA_INDEX": -1})
+    assert response.status_code == 400
+    result = response.get_json()
+    assert not result["success"]
+    assert result["rejected"] == {"CAMERA_INDEX": "must be >= 0"}
+    assert "CAMERA_INDEX" in result["error"]
+    assert web_server.CONFIG["SENSITIVITY"] == 30 and len(saved) == 1
+
+
+def test_update_config_converts_typed_settings(monkeypatch):
+    monkeypatch.setattr(web_server, "save_config", lambda c: True)
+    monkeypatch.setattr(web_server.socketio, "emit", lambda *a: None)
+    for key, value in (
+        ("MOTION_USE_GPU", True),
+        ("EVENT_COOLDOWN", 5),
+        ("JPEG_QUALITY", 70),
+        ("ANALYZER_INPUT_SIZE", 416),
+        ("MOTION_BUSY_STRIDE", 1),
+    ):
+        monkeypatch.setitem(web_server.CONFIG, key, value)
+    client = web_server.app.test_client()
+
+    result = client.post(
+        "/api/config",
+        json={
+            "MOTION_USE_GPU": "false",
+            "EVENT_COOLDOWN": "2.5",
+        },
+    ).get_json()
+
+    assert web_server.CONFIG["MOTION_USE_GPU"] is False
+    assert web_server.CONFIG["EVENT_COOLDOWN"] == 2.5
+    assert "restart the application" in result["message"]
+    assert "MOTION_USE_GPU" in result["message"]
+
+    rejected = client.post(
+        "/api/config",
+        json={
+            "JPEG_QUALITY": "150",
+            "ANALYZER_INPUT_SIZE": "400",
+            "MOTION_BUSY_STRIDE": "0",
+        },
+    ).get_json()["rejected"]
+    assert set(rejected) == {
+        "JPEG_QUALITY",
+        "ANALYZER_INPUT_SIZE",
+        "MOTION_BUSY_STRIDE",
+    }
+    assert web_server.CONFIG["JPEG_QUALITY"] == 70
+    assert web_server.CONFIG["ANALYZER_INPUT_SIZE"] == 416
+    assert web_server.CONFIG["MOTION_BUSY_STRIDE"] == 1
+
+    applied = client.post("/api/config", json={"JPEG_QUALITY": 90}).get_json()
+    assert web_server.CONFIG["JPEG_QUALITY"] == 90
+    assert "restart the application" not in applied["message"]
+
+
+def test_recent_events_stay_consistent_under_concurrent_writers(monkeypatch):
+    monkeypatch.setattr(web_server, "recent_events", web_server.deque(maxlen=50))
+    monkeypatch.setattr(web_server, "_events_json", None)
+    client = web_server.app.test_client()
+
+    def write(offset):
+        for i in range(200):
+            web_server.add_event({"timestamp": offset + i})
+
+    writers = [threading.Thread(target=write, args=(n * 1000,)) for n in range(4)]
+    for t in writers:
+        t.start()
+    while any(t.is_alive() for t in writers):
+        events = client.get("/api/events").get_json()["events"]
+        assert len(events) <= 50
+    for t in writers:
+        t.join()
+
+    events = client.get("/api/events").get_json()["events"]
+    assert len(events) == 50
+    assert len({e["timestamp"] for e in events}) == 50
+
+
+def test_get_recent_events_returns_a_snapshot(monkeypatch):
+    monkeypatch.setattr(web_server, "recent_events", web_server.deque(maxlen=5))
+    monkeypatch.setattr(web_server, "_events_json", None)
+    web_server.add_event({"timestamp": 1})
+    web_server.add_event({"timestamp": 2})
+
+    events = web_server.get_recent_events()
+    web_server.add_event({"timestamp": 3})
+
+    assert [e["timestamp"] for e in events] == [2, 1]
+
+
+def test_get_config_serves_cached_gzip(monkeypatch):
+    import gzip
+
+    monkeypatch.setattr(web_server, "_config_payload", None)
+    monkeypatch.setattr(web_server, "save_config", lambda c: True)
+    monkeypatch.setattr(web_server.socketio, "emit", lambda *a: None)
+    monkeypatch.setitem(web_server.CONFIG, "MIN_ANALYZE_AREA", 1500)
+    client = web_server.app.test_client()
+
+    plain = client.get("/api/config")
+    assert plain.get_json()["MIN_ANALYZE_AREA"] == 1500
+    assert "Content-Encoding" not in plain.headers
+
+    zipped = client.get("/api/config", headers={"Accept-Encoding": "gzip"})
+    assert zipped.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(zipped.data) == plain.data
+    assert "Accept-Encoding" in zipped.headers["Vary"]
+
+    refused = client.get("/api/config", headers={"Accept-Encoding": "gzip;q=0"})
+    assert "Content-Encoding" not in refused.headers
+
+    # A successful update invalidates the cached payload
+    client.post("/api/config", json={"MIN_ANALYZE_AREA": "2000"})
+    assert client.get("/api/config").get_json()["MIN_ANALYZE_AREA"] == 2000
+    # The payload was rebuilt from a CONFIG value monkeypatch is about to undo
+    web_server._config_payload = None
+
+
+def test_emit_motion_event_derives_missing_image_url(monkeypatch, tmp_path):
+    monkeypatch.setattr(web_server.socketio, "start_background_task", lambda *a: None)
+    monkeypatch.setattr(
+        web_server, "recent_events", web_server.deque(maxlen=web_server.MAX_EVENTS)
+    )
+
+    web_server.emit_motion_event(
+        {"timestamp": "t", "frame_path": str(tmp_path / "dog.jpg")}
+    )
+
+    assert web_server.recent_events[0]["image_url"] == "/frames/dog.jpg"
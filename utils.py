@@ -1,5 +1,40 @@
 import os
+import functools
 import cv2
+import numpy as np
+
+# PyTurboJPEG is optional: it feeds BGR arrays straight to libjpeg-turbo and
+# encodes faster than cv2.imencode. The wrapper also needs the native library,
+# so any failure to load it falls back to OpenCV.
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420
+
+    _TURBOJPEG = TurboJPEG()
+except Exception:
+    _TURBOJPEG = None
+
+# PyNvJpeg (nvJPEG on an NVIDIA GPU) is optional as well. Uploading a frame and
+# downloading the bytes only pays off on large frames; below
+# GPU_JPEG_MIN_PIXELS the CPU encoder is as fast or faster.
+try:
+    from nvjpeg import NvJpeg
+
+    _NVJPEG = NvJpeg()
+except Exception:
+    _NVJPEG = None
+HAVE_NVJPEG = _NVJPEG is not None
+GPU_JPEG_MIN_PIXELS = 1280 * 720
+
+# JPEG encoder settings for saved/sent frames: quality 80 with baseline Huffman
+# tables encodes faster and produces smaller files than OpenCV's default (95).
+JPEG_PARAMS = [
+    cv2.IMWRITE_JPEG_QUALITY,
+    80,
+    cv2.IMWRITE_JPEG_OPTIMIZE,
+    0,
+    cv2.IMWRITE_JPEG_PROGRESSIVE,
+    0,
+]
 
 
 def ensure_dir(path):
@@ -10,4 +45,55 @@ def ensure_dir(path):
 def save_frame(frame, path):
     ensure_dir(os.path.dirname(path) or ".")
     # OpenCV expects BGR; frame should be as-captured
-    cv2.imwrite(path, frame)
\ No newline at end of file
+    cv2.imwrite(path, frame, JPEG_PARAMS)
+
+
+@functools.lru_cache(maxsize=8)
+def parse_labels(value):
+    """Parse a comma-separated label string (e.g. "cat,person") into a frozenset."""
+    return frozenset(label.strip() for label in value.split(","))
+
+
+@functools.lru_cache(maxsize=8)
+def format_labels(labels):
+    """Render a label set as a sorted, comma-separated string for log messages."""
+    return ", ".join(sorted(labels))
+
+
+def encode_jpeg(frame, quality=80, gpu=False):
+    """Encode a BGR frame as JPEG bytes, using libjpeg-turbo when available.
+
+    Args:
+        frame: BGR uint8 numpy array
+        quality: JPEG quality (1-100)
+        gpu: Encode frames larger than GPU_JPEG_MIN_PIXELS with nvJPEG when
+            PyNvJpeg is installed
+
+    Returns:
+        The encoded bytes, or None if encoding failed
+    """
+    if (
+        gpu
+        and _NVJPEG is not None
+        and frame.shape[0] * frame.shape[1] > GPU_JPEG_MIN_PIXELS
+    ):
+        return _NVJPEG.encode(np.ascontiguousarray(frame), quality)
+    if _TURBOJPEG is not None:
+        return _TURBOJPEG.encode(
+            np.ascontiguousarray(frame),
+            quality=quality,
+            pixel_format=TJPF_BGR,
+            jpeg_subsample=TJSAMP_420,
+        )
+    # Same settings as JPEG_PARAMS: no Huffman optimization or progressive
+    # passes, which cost encode time a live stream cannot spare
+    params = [
+        cv2.IMWRITE_JPEG_QUALITY,
+        quality,
+        cv2.IMWRITE_JPEG_OPTIMIZE,
+        0,
+        cv2.IMWRITE_JPEG_PROGRESSIVE,
+        0,
+    ]
+    ok, buffer = cv2.imencode(".jpg", frame, params)
+    return buffer.tobytes() if ok else None
\ No newline at end of file
@@ -1,7 +1,19 @@
+from config import CONFIG, save_config
+
+# When run standalone this is the entry module, so it has to patch the stdlib
+# for eventlet itself before threading/socket are imported (main.py does this
+# when the server runs as part of the detector)
+if __name__ == "__main__" and CONFIG.get("WEB_ASYNC_MODE") == "eventlet":
+    import eventlet
+
+    eventlet.monkey_patch()
+
 import os
-import glob
+import functools
+import gzip
 import time
-import cv2
+import threading
+from collections import OrderedDict, deque
 from flask import (
     Flask,
     render_template,
@@ -12,16 +24,58 @@ from flask import (
     jsonify,
 )
 from flask_socketio import SocketIO
-from config import CONFIG, save_config, load_config
 from frame_producer import FrameProducer
+from h264_stream import H264Stream, FFMPEG
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = "cat-motion-detector-secret"
-socketio = SocketIO(app, cors_allowed_origins="*")
+# "eventlet" serves clients cooperatively instead of one Werkzeug thread each
+socketio = SocketIO(
+    app,
+    cors_allowed_origins="*",
+    async_mode=CONFIG.get("WEB_ASYNC_MODE", "threading"),
+)
 
-# Store recent motion events in memory
-recent_events = []
+# Store recent motion events in memory, newest first; the deque drops the
+# oldest event itself once MAX_EVENTS is reached
 MAX_EVENTS = 100
+recent_events = deque(maxlen=MAX_EVENTS)
+# Serialized /api/events payload, rebuilt on the first request after an event
+# is added. The page only loads it once and then follows "motion_detected".
+# _events_lock serializes writers (add_event may run on any analyzer or
+# background thread) and cache rebuilds; readers of the cache take no lock.
+_events_json = None
+_events_lock = threading.Lock()
+
+# (json, gzipped json) of CONFIG for GET /api/config; cleared by update_config
+_config_payload = None
+
+# Encoded JPEGs of the latest events, keyed by image_url, so /frames can serve
+# them from memory instead of re-reading the file that was just written
+_recent_images = OrderedDict()
+_recent_images_lock = threading.Lock()
+MAX_CACHED_IMAGES = 16
+# Event images are written once under a timestamped name and never change,
+# so browsers may keep them for a year instead of re-fetching on each reload
+FRAME_MAX_AGE = 365 * 24 * 3600
+# The settings page is a static shell that loads its values from the API
+SETTINGS_PAGE_MAX_AGE = 3600
+
+# Per-client MJPEG backpressure: when writing a frame to a client takes longer
+# than STREAM_SLOW_MS on average, every other frame is dropped and the JPEG
+# quality steps down to STREAM_MIN_QUALITY; below STREAM_FAST_MS it recovers
+# towards JPEG_QUALITY
+STREAM_SLOW_MS = 200
+STREAM_FAST_MS = 50
+STREAM_MIN_QUALITY = 60
+STREAM_QUALITY_STEP = 5
+
+# Multipart envelope around each MJPEG frame, built once
+_MJPEG_PREFIX = b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"
+_MJPEG_SUFFIX = b"\r\n"
+
+# Guards creation of the shared H.264 stream (see video_feed_h264)
+_h264_lock = threading.Lock()
 
 
 def restart_camera():
@@ -34,7 +88,12 @@ def restart_camera():
         time.sleep(0.5)  # Give it time to release
 
         # Update camera index and restart
-        new_producer = FrameProducer(camera_index=CONFIG.get("CAMERA_INDEX", 0))
+        new_producer = FrameProducer(
+            camera_index=CONFIG.get("CAMERA_INDEX", 0),
+            target_fps=CONFIG.get("CAPTURE_FPS", 10),
+            buffer_size=CONFIG.get("CAPTURE_BUFFER_SIZE", 1),
+            jpeg_encoder=CONFIG.get("JPEG_ENCODER", "cpu"),
+        )
         new_producer.start()
         current_app.config["FRAME_PRODUCER"] = new_producer
         print("Camera restarted successfully")
@@ -42,9 +101,10 @@ def restart_camera():
 
 def add_event(event):
     """Add a motion event to the recent events list."""
-    recent_events.insert(0, event)
-    if len(recent_events) > MAX_EVENTS:
-        recent_events.pop()
+    global _events_json
+    with _events_lock:
+        recent_events.appendleft(event)
+        _events_json = None
 
 
 @app.route("/")
@@ -56,79 +116,212 @@ def index():
 @app.route("/api/events", methods=["GET"])
 def api_get_recent_events():
     """API endpoint to get recent events."""
-    return jsonify({"events": recent_events})
+    global _events_json
+    # Lock-free fast path: the cached payload is an immutable snapshot that
+    # add_event only ever replaces, so reading the reference is always safe
+    data = _events_json
+    if data is None:
+        with _events_lock:
+            if _events_json is None:
+                # tuple() copies the deque in one step under the GIL
+                _events_json = app.json.dumps({"events": tuple(recent_events)})
+            data = _events_json
+    return Response(data, mimetype="application/json")
+
+
+@functools.lru_cache(maxsize=4)
+def _load_coco_classes(path):
+    """Read the class names file once per path; it does not change at runtime."""
+    if not os.path.exists(path):
+        return ()
+    with open(path, "r") as f:
+        return tuple(line.strip() for line in f)
 
 
 @app.route("/settings")
 def settings():
-    """Serve the settings/config page."""
-    # Load COCO class names
-    coco_classes = []
-    classes_path = CONFIG.get("ANALYZER_CLASSES_PATH", "yolo_files/coco.names")
-    if os.path.exists(classes_path):
-        with open(classes_path, "r") as f:
-            coco_classes = [line.strip() for line in f.readlines()]
+    """Serve the settings/config page.
 
-    return render_template("settings.html", config=CONFIG, coco_classes=coco_classes)
+    The page has no server-side values; it fetches /api/config and
+    /api/coco_classes itself, so the HTML is sent as a cacheable static file.
+    """
+    return send_from_directory(
+        app.static_folder, "settings.html", max_age=SETTINGS_PAGE_MAX_AGE
+    )
+
+
+@app.route("/api/coco_classes", methods=["GET"])
+def get_coco_classes():
+    """API endpoint to get the class names objects can be detected as."""
+    # Cached per ANALYZER_CLASSES_PATH
+    classes_path = CONFIG.get("ANALYZER_CLASSES_PATH", "yolo_files/coco.names")
+    return jsonify({"classes": list(_load_coco_classes(classes_path))})
 
 
 @app.route("/api/config", methods=["GET"])
 def get_config():
     """API endpoint to get current config values."""
-    return jsonify(CONFIG)
+    global _config_payload
+    payload = _config_payload
+    if payload is None:
+        body = app.json.dumps(CONFIG).encode()
+        payload = _config_payload = (body, gzip.compress(body))
+    body, compressed = payload
+
+    if request.accept_encodings["gzip"] > 0:
+        response = Response(compressed, mimetype="application/json")
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        response = Response(body, mimetype="application/json")
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def _raw(value):
+    return value
+
+
+def _int_between(minimum, maximum=None):
+    def validate(value):
+        value = int(value)
+        if value < minimum:
+            raise ValueError(f"must be >= {minimum}")
+        if maximum is not None and value > maximum:
+            raise ValueError(f"must be <= {maximum}")
+        return value
+
+    return validate
+
+
+def _int_at_least(minimum):
+    return _int_between(minimum)
+
+
+def _multiple_of(step):
+    def validate(value):
+        value = int(value)
+        if value < step or value % step:
+            raise ValueError(f"must be a positive multiple of {step}")
+        return value
+
+    return validate
+
+
+def _float(value):
+    value = float(value)
+    if not value >= 0:
+        raise ValueError("must be >= 0")
+    return value
+
+
+def _bool(value):
+    return str(value).lower() == "true"
+
+
+def _choice(*choices):
+    def validate(value):
+        if value not in choices:
+            raise ValueError(f"must be one of {choices}")
+        return value
+
+    return validate
+
+
+# Settings the API may change: key -> (converter, category). Converters raise
+# on invalid input, which rejects the whole update. Categories: "camera" restarts the
+# camera, "restart" is only read at startup and needs an application restart,
+# None applies directly.
+_VALIDATORS = {
+    "SENSITIVITY": (_int_at_least(1), "restart"),
+    "MIN_AREA": (_int_at_least(1), "restart"),
+    "MIN_ANALYZE_AREA": (_int_at_least(0), "restart"),
+    "EVENT_COOLDOWN": (_float, "restart"),
+    "MOTION_WORK_WIDTH": (_int_at_least(1), "restart"),
+    "MOTION_USE_GPU": (_bool, "restart"),
+    "MOTION_BACKGROUND": (_choice("mog2", "average"), "restart"),
+    "MOTION_BUSY_STRIDE": (_int_at_least(1), "restart"),
+    "MOTION_HI_THRESH": (_float, "restart"),
+    "MOTION_LO_THRESH": (_float, "restart"),
+    "CAMERA_INDEX": (_int_at_least(0), "camera"),
+    "CAPTURE_FPS": (_int_at_least(0), "camera"),
+    "CAPTURE_BUFFER_SIZE": (_int_at_least(1), "camera"),
+    "JPEG_ENCODER": (_choice("cpu", "gpu"), "camera"),
+    "JPEG_QUALITY": (_int_between(1, 100), None),
+    "WEB_HOST": (_raw, "restart"),
+    "WEB_PORT": (_int_between(1, 65535), "restart"),
+    "WEB_ASYNC_MODE": (_choice("threading", "eventlet"), "restart"),
+    "FRAME_DIR": (_raw, "restart"),
+    "TARGET_OBJECTS": (_raw, None),
+    "EXPECTED_LABEL": (_raw, None),
+    "DISCORD_WEBHOOK_URL": (_raw, None),
+    "TELEGRAM_TOKEN": (_raw, "restart"),
+    "TELEGRAM_CHAT_ID": (_raw, "restart"),
+    "ANALYZER_MODEL_PATH": (_raw, "restart"),
+    "ANALYZER_CONFIG_PATH": (_raw, "restart"),
+    "ANALYZER_CLASSES_PATH": (_raw, "restart"),
+    "ANALYZER_INPUT_SIZE": (_multiple_of(32), "restart"),
+    "ANALYZER_BATCH_SIZE": (_int_at_least(1), "restart"),
+    "ANALYZER_BACKEND": (
+        _choice("auto", "cuda", "opencl", "openvino", "cpu"),
+        "restart",
+    ),
+    "ANALYZER_PRECISION": (_choice("auto", "fp16", "fp32"), "restart"),
+    "DEBUG": (_bool, "restart"),
+    "DEBUG_SAVE_FRAMES": (_bool, "restart"),
+}
 
 
 @app.route("/api/config", methods=["POST"])
 def update_config():
     """API endpoint to update config values."""
+    global _config_payload
     try:
         data = request.get_json()
-        camera_index_changed = False
-        config_changed = False
-        detection_config_changed = False
-        old_camera_index = CONFIG.get("CAMERA_INDEX", 0)
 
-        # Update CONFIG with new values and track changes
+        # Validate everything first so an invalid value leaves CONFIG untouched
+        updates = {}
+        rejected = {}
         for key, value in data.items():
-            if key in CONFIG:
-                old_value = CONFIG[key]
-
-                # Convert types appropriately
-                if key in ["SENSITIVITY", "MIN_AREA", "CAMERA_INDEX", "WEB_PORT"]:
-                    new_value = int(value)
-                    # Validate camera index is non-negative
-                    if key == "CAMERA_INDEX" and new_value < 0:
-                        continue  # Skip invalid camera index
-                    # Validate sensitivity and min_area are positive
-                    if key in ["SENSITIVITY", "MIN_AREA"] and new_value < 1:
-                        continue  # Skip invalid values
-
-                    if old_value != new_value:
-                        config_changed = True
-                        CONFIG[key] = new_value
-
-                        if key == "CAMERA_INDEX":
-                            camera_index_changed = True
-                        # Mark that detection config changed
-                        elif key in ["SENSITIVITY", "MIN_AREA"]:
-                            detection_config_changed = True
-                elif key == "DEBUG":
-                    new_value = str(value).lower() == "true"
-                    if old_value != new_value:
-                        config_changed = True
-                        CONFIG[key] = new_value
-                else:
-                    if old_value != value:
-                        config_changed = True
-                        CONFIG[key] = value
+            entry = _VALIDATORS.get(key)
+            if entry is None:
+                continue
+            validate, category = entry
+            try:
+                updates[key] = (validate(value), category)
+            except (TypeError, ValueError) as e:
+                rejected[key] = str(e)
+        if rejected:
+            reasons = "; ".join(f"{key} {reason}" for key, reason in rejected.items())
+            return (
+                jsonify(
+                    {
+                        "success": False,
+                        "error": f"Invalid settings: {reasons}",
+                        "rejected": rejected,
+                    }
+                ),
+                400,
+            )
+
+        # Update CONFIG with new values and track changes
+        changed = {}
+        for key, (new_value, category) in updates.items():
+            if CONFIG[key] != new_value:
+                CONFIG[key] = new_value
+                changed.setdefault(category, []).append(key)
+
+        config_changed = bool(changed)
+        camera_changed = "camera" in changed
+        restart_keys = changed.get("restart", [])
 
         # Only save if something actually changed
         save_success = True
         if config_changed:
+            _config_payload = None
             save_success = save_config(CONFIG)
 
-        # Restart camera only if camera index actually changed
-        if camera_index_changed:
+        # Restart camera only if a camera setting actually changed
+        if camera_changed:
             restart_camera()
 
         # Emit event to notify clients of config change (only if changed)
@@ -140,10 +333,13 @@ def update_config():
             message = "No changes detected."
         else:
             message = "Settings saved successfully!"
-            if camera_index_changed:
+            if camera_changed:
                 message += " Camera restarted."
-            if detection_config_changed:
-                message += " Please restart the application for sensitivity/area changes to take effect."
+            if restart_keys:
+                message += (
+                    " Please restart the application for changes to "
+                    f"{', '.join(restart_keys)} to take effect."
+                )
             # TARGET_OBJECTS changes are applied automatically, no restart needed
 
         return jsonify(
@@ -169,37 +365,91 @@ def video_feed():
         return "Frame producer not initialized", 503
 
     def generate():
+        last_id = 0
+        quality = CONFIG.get("JPEG_QUALITY", 80)
+        send_ms = 0.0
+        skip = False
         while True:
-            # Get the current frame from the frame producer
-            frame = frame_producer.get_frame()
+            if skip:
+                # Client is falling behind: let one frame go by unencoded
+                last_id, _ = frame_producer.wait_for_frame(
+                    last_id, timeout=1.0, copy=False
+                )
+            # Block until the producer publishes a new frame; frames captured
+            # while this client was sending are skipped, not queued. The
+            # producer encodes each frame once for all connected clients.
+            frame_id, frame_data = frame_producer.wait_for_jpeg(
+                last_id, timeout=1.0, quality=quality
+            )
+            if frame_data is None or frame_id == last_id:
+                if not frame_producer.is_running():
+                    time.sleep(0.5)
+                continue
+            last_id = frame_id
+
+            # Yield the frame in MJPEG format as one chunk; join copies the
+            # JPEG once, where chained + copies it twice. The generator resumes
+            # once the server has written it, so this measures the client's
+            # write rate.
+            start = time.monotonic()
+            yield b"".join((_MJPEG_PREFIX, frame_data, _MJPEG_SUFFIX))
+            send_ms = 0.5 * send_ms + 0.5 * (time.monotonic() - start) * 1000
+            skip = send_ms > STREAM_SLOW_MS
+            # Re-read every frame so a JPEG_QUALITY change reaches open streams
+            max_quality = CONFIG.get("JPEG_QUALITY", 80)
+            if skip:
+                quality = max(STREAM_MIN_QUALITY, quality - STREAM_QUALITY_STEP)
+            elif send_ms < STREAM_FAST_MS:
+                quality = quality + STREAM_QUALITY_STEP
+            quality = min(max_quality, quality)
 
-            if frame is not None:
-                try:
-                    # Encode the frame as JPEG
-                    ret, buffer = cv2.imencode(".jpg", frame)
+    return Response(generate(), mimetype="multipart/x-mixed-replace; boundary=frame")
 
-                    if ret:
-                        frame_data = buffer.tobytes()
 
-                        # Yield the frame in MJPEG format
-                        yield (
-                            b"--frame\r\n"
-                            b"Content-Type: image/jpeg\r\n\r\n" + frame_data + b"\r\n"
-                        )
-                except Exception as e:
-                    print(f"Error encoding frame: {e}")
+@app.route("/video_feed_h264")
+def video_feed_h264():
+    """Route for the H.264 (fragmented MP4) video stream.
 
-            # Wait a bit before getting the next frame
-            time.sleep(0.1)
+    Far less bandwidth than /video_feed for remote viewers, at the cost of
+    encoder latency; one ffmpeg process serves every client.
+    """
+    frame_producer = current_app.config.get("FRAME_PRODUCER")
 
-    return Response(generate(), mimetype="multipart/x-mixed-replace; boundary=frame")
+    if frame_producer is None:
+        return "Frame producer not initialized", 503
+    if FFMPEG is None:
+        return "ffmpeg not available", 503
+
+    with _h264_lock:
+        stream = current_app.config.get("H264_STREAM")
+        # The camera restart swaps in a new producer; follow it
+        if stream is None or stream.frame_producer is not frame_producer:
+            stream = H264Stream(frame_producer, fps=CONFIG.get("CAPTURE_FPS", 10))
+            current_app.config["H264_STREAM"] = stream
+
+    return Response(stream.subscribe(), mimetype="video/mp4")
 
 
 @app.route("/frames/<filename>")
 def serve_frame(filename):
     """Serve individual frame images."""
-    frame_dir = CONFIG.get("FRAME_DIR", "frames")
-    return send_from_directory(frame_dir, filename)
+    # Cached images are keyed by their URL, i.e. this request's path
+    with _recent_images_lock:
+        jpeg = _recent_images.get(request.path)
+    if jpeg is not None:
+        response = Response(jpeg, mimetype="image/jpeg")
+        response.cache_control.max_age = FRAME_MAX_AGE
+    else:
+        # send_from_directory hands the file to wsgi.file_wrapper (sendfile
+        # under servers that support it) and answers If-Modified-Since/ETag
+        # revalidation with 304
+        frame_dir = CONFIG.get("FRAME_DIR", "frames")
+        response = send_from_directory(
+            frame_dir, filename, max_age=FRAME_MAX_AGE, conditional=True
+        )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 
 @socketio.on("connect")
@@ -214,25 +464,35 @@ def handle_disconnect():
     print("Client disconnected")
 
 
-def emit_motion_event(event):
-    """Emit a motion detection event to all connected clients."""
-    # Prepare event data for web clients
-    web_event = {
-        "timestamp": event["timestamp"],
-        "frame_path": event["frame_path"],
-        "image_url": f"/frames/{os.path.basename(event['frame_path'])}",
-    }
+def emit_motion_event(event, jpeg=None):
+    """Emit a motion detection event to all connected clients.
+
+    Args:
+        event: Web event dict with "timestamp", "frame_path" and "image_url";
+            it is stored and broadcast as-is. "image_url" is derived from
+            frame_path when missing.
+        jpeg: The already-encoded image, kept in memory and served from
+            image_url without touching the disk
+    """
+    if "image_url" not in event:
+        event["image_url"] = f"/frames/{os.path.basename(event['frame_path'])}"
+    if jpeg is not None:
+        with _recent_images_lock:
+            _recent_images[event["image_url"]] = jpeg
+            while len(_recent_images) > MAX_CACHED_IMAGES:
+                _recent_images.popitem(last=False)
 
-    # Add to recent events (store the web_event with image_url)
-    add_event(web_event)
+    add_event(event)
 
-    # Broadcast to all connected clients
-    socketio.emit("motion_detected", web_event)
+    # Broadcast to all connected clients from a background task, so the
+    # caller (the analyzer worker) does not wait on the fan-out
+    socketio.start_background_task(socketio.emit, "motion_detected", event)
 
 
 def get_recent_events():
-    """Get the list of recent motion events."""
-    return recent_events
+    """Get the list of recent motion events, newest first."""
+    with _events_lock:
+        return list(recent_events)
 
 
 if __name__ == "__main__":